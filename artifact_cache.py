@@ -0,0 +1,69 @@
+"""
+Rooster Omzetter – begrensde cache voor gegenereerde agenda's.
+
+Sleutels zijn inhoudsgebaseerd (digest van het bestand, kolomkeuze, 'allen'-
+selectie, ...), dus dezelfde invoer levert altijd een hit op, ook over sessies
+heen. Bij een volle cache wordt de minst recent gebruikte entry verwijderd.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def content_digest(data):
+    """Hex-digest van bytes (bijv. het geüploade Excel-bestand)."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class ArtifactCache:
+    """LRU-cache met een bovengrens in bytes; veilig bij gelijktijdige sessies."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()  # sleutel -> (waarde, grootte)
+        self._lock = threading.Lock()
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value, size):
+        """Bewaar value (size bytes); te grote waarden worden niet gecachet."""
+        with self._lock:
+            if key in self._items:
+                self.bytes_used -= self._items.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._items[key] = (value, size)
+            self.bytes_used += size
+            while self.bytes_used > self.max_bytes:
+                _, (_, old_size) = self._items.popitem(last=False)
+                self.bytes_used -= old_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.bytes_used = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._items),
+                "bytes_used": self.bytes_used,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,124 @@
+"""
+Rooster Omzetter – snelle ICS-writer.
+
+Schrijft VCALENDAR/VEVENT-blokken direct volgens RFC 5545 naar een buffer of
+bestand, zonder eerst een icalendar-objectmodel op te bouwen. Alleen de
+properties die de engine gebruikt worden ondersteund; de icalendar-route in
+rooster_engine blijft bestaan als referentie-implementatie.
+"""
+import io
+from datetime import timezone
+
+CRLF = b"\r\n"
+FOLD_LIMIT = 75  # octets per regel, exclusief CRLF (RFC 5545 §3.1)
+
+_TEXT_ESCAPES = str.maketrans({"\\": "\\\\", ";": "\\;", ",": "\\,", "\n": "\\n"})
+
+
+def escape_text(value):
+    """TEXT-escaping (RFC 5545 §3.3.11): backslash, ';', ',' en regeleinden."""
+    text = str(value)
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text.translate(_TEXT_ESCAPES)
+
+
+def format_datetime(dt):
+    """Zwevende lokale tijd (zonder tijdzone), bijv. 20250902T083000."""
+    return dt.strftime("%Y%m%dT%H%M%S")
+
+
+def format_utc(dt):
+    """Tijd in UTC, bijv. 20250902T063000Z (voor DTSTAMP; dt moet een tijdzone hebben)."""
+    return dt.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def fold_line(line):
+    """
+    Vouw één contentregel (bytes, UTF-8) op maximaal 75 octets per fysieke regel,
+    inclusief de spatie aan het begin van vervolgregels. UTF-8-tekens en
+    backslash-escapes worden nooit over twee regels gesplitst.
+    """
+    if len(line) <= FOLD_LIMIT:
+        return line + CRLF
+    parts, start, limit = [], 0, FOLD_LIMIT
+    while len(line) - start > limit:
+        cut = start + limit
+        while line[cut] & 0xC0 == 0x80:  # midden in een UTF-8-teken
+            cut -= 1
+        run = 0  # backslashes direct voor cut; oneven = cut valt midden in een escape
+        while cut - 1 - run >= start and line[cut - 1 - run] == 0x5C:
+            run += 1
+        if run % 2:
+            cut -= 1
+        parts.append(line[start:cut])
+        start, limit = cut, FOLD_LIMIT - 1
+    parts.append(line[start:])
+    return b"\r\n ".join(parts) + CRLF
+
+
+def content_line(name, value):
+    """Gevouwen contentregel NAME:value (value is al geëscaped/geformatteerd)."""
+    return fold_line(f"{name}:{value}".encode("utf-8"))
+
+
+def event_block(event):
+    """
+    Eén VEVENT als bytes. event is een dict met summary, dtstart, dtend,
+    description, en optioneel uid, dtstamp, sequence en status; ontbrekende of
+    lege (None) velden worden weggelaten.
+    """
+    lines = [b"BEGIN:VEVENT\r\n"]
+    if event.get("uid") is not None:
+        lines.append(content_line("UID", escape_text(event["uid"])))
+    if event.get("dtstamp") is not None:
+        lines.append(content_line("DTSTAMP", format_utc(event["dtstamp"])))
+    if event.get("sequence") is not None:
+        lines.append(content_line("SEQUENCE", int(event["sequence"])))
+    if event.get("status") is not None:
+        lines.append(content_line("STATUS", event["status"]))
+    if event.get("summary") is not None:
+        lines.append(content_line("SUMMARY", escape_text(event["summary"])))
+    if event.get("dtstart") is not None:
+        lines.append(content_line("DTSTART", format_datetime(event["dtstart"])))
+    if event.get("dtend") is not None:
+        lines.append(content_line("DTEND", format_datetime(event["dtend"])))
+    if event.get("description") is not None:
+        lines.append(content_line("DESCRIPTION", escape_text(event["description"])))
+    lines.append(b"END:VEVENT\r\n")
+    return b"".join(lines)
+
+
+def write_calendar(out, events, prodid, description=None):
+    """
+    Stream een complete VCALENDAR naar out (bestandsobject met write(bytes)).
+    events mag een generator zijn: elk VEVENT wordt geschreven zodra het klaar is.
+    description: optionele agendabeschrijving (X-WR-CALDESC; die kennen meer
+    clients dan DESCRIPTION uit RFC 7986, en twee keer dezelfde tekst is zonde).
+    Geeft het aantal geschreven events terug.
+    """
+    return write_blocks(out, (event_block(event) for event in events), prodid, description)
+
+
+def write_blocks(out, blocks, prodid, description=None):
+    """
+    Als write_calendar, maar met kant-en-klare VEVENT-blokken (event_block), zodat
+    één geserialiseerd event in meerdere agenda's hergebruikt kan worden.
+    """
+    out.write(b"BEGIN:VCALENDAR\r\nVERSION:2.0\r\n")
+    out.write(content_line("PRODID", prodid))
+    if description is not None:
+        out.write(content_line("X-WR-CALDESC", escape_text(description)))
+    count = 0
+    for block in blocks:
+        out.write(block)
+        count += 1
+    out.write(b"END:VCALENDAR\r\n")
+    return count
+
+
+def calendar_bytes(events, prodid, description=None):
+    """Als write_calendar, maar geeft de hele agenda als bytes terug."""
+    buf = io.BytesIO()
+    write_calendar(buf, events, prodid, description)
+    return buf.getvalue()
@@ -0,0 +1,197 @@
+"""
+Rooster Omzetter – benchmarks.
+
+Meet de stappen van de omzetting op synthetische roosters (rooster_synth.py) van
+oplopende grootte: Excel inlezen, kolommen herkennen, sorteren, normaliseren,
+ICS per docent en de ZIP. Rapporteert tijden, schaalgedrag (exponent tussen
+opeenvolgende groottes) en piekgeheugen per stap, en faalt (exitcode 1) als een
+stap ten opzichte van een eerder opgeslagen baseline meer dan de drempel
+langzamer of zwaarder is geworden.
+
+Voorbeelden:
+    python rooster_bench.py --groottes 1000,10000 --uitvoer bench.json
+    python rooster_bench.py --groottes 1000,10000 --baseline bench.json --drempel 0.25
+"""
+import argparse
+import json
+import math
+import platform
+import sys
+import tracemalloc
+from time import perf_counter
+
+from rooster_engine import (
+    AUTODETECT_SAMPLE_ROWS, autodetect_columns, excel_engine, generate_all, list_teachers, normalize_roster,
+    read_roster, roster_memory, sort_df_chronologically, zip_bytes,
+)
+from rooster_synth import make_roster, roster_xlsx_bytes
+
+STAGES = ["load_excel", "autodetect", "sort", "normalize", "ics", "zip"]
+
+# Verschillen onder deze grenzen tellen nooit als regressie (meetruis bij kleine roosters)
+MIN_SECONDS = 0.05
+MIN_BYTES = 1024 * 1024
+
+
+def _stage_functions(data, column_vars):
+    """Per stap een functie(state) die het resultaat in state zet; in pipeline-volgorde."""
+    def load_excel(state):
+        state["df"] = read_roster(data, usecols=list(column_vars.values()))
+
+    def autodetect(state):
+        state["sample"] = autodetect_columns(state["df"].head(AUTODETECT_SAMPLE_ROWS))
+        state["full"] = autodetect_columns(state["df"])
+
+    def sort(state):
+        sort_df_chronologically(state["df"], column_vars, warnings=[])
+
+    def normalize(state):
+        state["roster"] = normalize_roster(state["df"], column_vars)
+
+    def ics(state):
+        state["ics"] = generate_all(state["roster"], column_vars, list_teachers(state["roster"]), include_allen=True,
+                                    warnings=[], workers=1)
+
+    def zip_stage(state):
+        state["zip"] = zip_bytes(state["ics"])
+
+    return [("load_excel", load_excel), ("autodetect", autodetect), ("sort", sort), ("normalize", normalize),
+            ("ics", ics), ("zip", zip_stage)]
+
+
+def bench_size(rows, repeat=1, memory=True, seed=0):
+    """
+    Alle stappen voor één roostergrootte. Tijd = beste van `repeat` runs; het
+    piekgeheugen (tracemalloc) wordt in een aparte run gemeten, zodat de
+    tijdmeting er niet door vertraagd wordt.
+    """
+    df = make_roster(rows, seed=seed)
+    data = roster_xlsx_bytes(df)
+    column_vars = {col: col for col in df.columns if col != "Opmerking"}
+    stages = _stage_functions(data, column_vars)
+
+    seconds = {name: math.inf for name, _ in stages}
+    state = {}
+    for _ in range(repeat):
+        state = {}
+        for name, fn in stages:
+            t0 = perf_counter()
+            fn(state)
+            seconds[name] = min(seconds[name], perf_counter() - t0)
+
+    peak = {}
+    if memory:
+        mem_state = {}
+        tracemalloc.start()
+        try:
+            for name, fn in stages:
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+                fn(mem_state)
+                peak[name] = tracemalloc.get_traced_memory()[1] - base
+        finally:
+            tracemalloc.stop()
+
+    teachers = len(state["ics"])
+    return {
+        "rows": rows,
+        "teachers": teachers,
+        "xlsx_bytes": len(data),
+        "ics_bytes": sum(len(b) for b in state["ics"].values()),
+        "roster_bytes": sum(roster_memory(state["roster"]).values()),
+        "seconds": {name: round(s, 4) for name, s in seconds.items()},
+        "ms_per_teacher": round(seconds["ics"] * 1000 / teachers, 2) if teachers else None,
+        "peak_bytes": peak,
+    }
+
+
+def scaling(results, stage):
+    """Schaal-exponent tussen opeenvolgende groottes: 1.0 = lineair, 2.0 = kwadratisch."""
+    out = []
+    for a, b in zip(results, results[1:]):
+        ta, tb = a["seconds"][stage], b["seconds"][stage]
+        out.append(round(math.log(tb / ta) / math.log(b["rows"] / a["rows"]), 2) if ta > 0 and tb > 0 else None)
+    return out
+
+
+def compare(results, baseline, threshold):
+    """Regressies t.o.v. een baseline (zelfde groottes); lijst van meldingen."""
+    base_by_rows = {r["rows"]: r for r in baseline["results"]}
+    problems = []
+    for r in results:
+        base = base_by_rows.get(r["rows"])
+        if base is None:
+            continue
+        for stage in STAGES:
+            now, before = r["seconds"].get(stage), base["seconds"].get(stage)
+            if now is not None and before is not None and now - before > MIN_SECONDS and now > before * (1 + threshold):
+                problems.append(f"{stage} @ {r['rows']} regels: {before:.3f}s -> {now:.3f}s "
+                                f"(+{(now / before - 1) * 100:.0f}%)")
+            now, before = r["peak_bytes"].get(stage), base.get("peak_bytes", {}).get(stage)
+            if now is not None and before is not None and now - before > MIN_BYTES and now > before * (1 + threshold):
+                problems.append(f"{stage} @ {r['rows']} regels: piekgeheugen {before / 1e6:.1f} MB -> "
+                                f"{now / 1e6:.1f} MB (+{(now / before - 1) * 100:.0f}%)")
+    return problems
+
+
+def print_report(results):
+    header = f"{'stap':<12}" + "".join(f"{r['rows']:>12,}" for r in results)
+    print("Tijd (s)")
+    print(header)
+    for stage in STAGES:
+        print(f"{stage:<12}" + "".join(f"{r['seconds'][stage]:>12.3f}" for r in results))
+    if any(r["peak_bytes"] for r in results):
+        print("\nPiekgeheugen (MB)")
+        print(header)
+        for stage in STAGES:
+            print(f"{stage:<12}" + "".join(f"{r['peak_bytes'].get(stage, 0) / 1e6:>12.1f}" for r in results))
+    print("\nRooster in geheugen (MB) " + "  ".join(f"{r['rows']:,}: {r['roster_bytes'] / 1e6:.1f}"
+                                                  for r in results if "roster_bytes" in r))
+    print("Per docent (ms)   " + "  ".join(f"{r['rows']:,}: {r['ms_per_teacher']}" for r in results))
+    if len(results) > 1:
+        print("\nSchaalgedrag (exponent per stap tussen opeenvolgende groottes; 1 = lineair)")
+        for stage in STAGES:
+            print(f"{stage:<12}" + "".join(f"{'-' if e is None else e:>12}" for e in scaling(results, stage)))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de rooster-omzetting op synthetische roosters.")
+    parser.add_argument("--groottes", default="1000,10000,100000",
+                        help="kommagescheiden aantallen regels (standaard 1000,10000,100000)")
+    parser.add_argument("--herhalingen", type=int, default=1, help="runs per grootte; de snelste telt (standaard 1)")
+    parser.add_argument("--geen-geheugen", action="store_true", help="piekgeheugen niet meten (scheelt een run)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--uitvoer", metavar="JSON", help="resultaten opslaan (bruikbaar als --baseline)")
+    parser.add_argument("--baseline", metavar="JSON", help="eerdere --uitvoer om regressies tegen te toetsen")
+    parser.add_argument("--drempel", type=float, default=0.25,
+                        help="toegestane verslechtering per stap t.o.v. de baseline (standaard 0.25 = 25%%)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = [int(s) for s in args.groottes.split(",") if s.strip()]
+    results = []
+    for rows in sizes:
+        print(f"[{rows:,} regels] ...", file=sys.stderr)
+        results.append(bench_size(rows, args.herhalingen, not args.geen_geheugen, args.seed))
+    print_report(results)
+
+    if args.uitvoer:
+        with open(args.uitvoer, "w", encoding="utf-8") as f:
+            json.dump({"python": platform.python_version(), "excel_engine": excel_engine(), "results": results},
+                      f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            problems = compare(results, json.load(f), args.drempel)
+        if problems:
+            print("\nRegressies:", file=sys.stderr)
+            for p in problems:
+                print(f"  {p}", file=sys.stderr)
+            return 1
+        print("\nGeen regressies t.o.v. de baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+"""
+Rooster Omzetter – command-line.
+
+Zet een Excel-rooster in één keer om naar ICS-bestanden voor alle (of gekozen)
+docenten, zonder Streamlit. Handig voor cron of een build-job.
+
+Voorbeelden:
+    python rooster_cli.py rooster.xlsx --out agenda/
+    python rooster_cli.py rooster.xlsx --zip alle_docenten.ics.zip --allen --workers 8
+    python rooster_cli.py rooster.xlsx --out agenda/ --docent piet --docent anna
+    python rooster_cli.py rooster.xlsx --out agenda/ --kolom "Zaal=Lokaal"
+    python rooster_cli.py nieuw.xlsx --out agenda/ --vorige-status agenda/rooster_status.json
+    python rooster_cli.py rooster.xlsx --out agenda/ --geschiedenis laatste --lessen 3 --compact
+    python rooster_cli.py rooster.xlsx --zip alles.zip --weergave groep --weergave zaal
+"""
+import argparse
+import os
+import sys
+
+from rooster_engine import (
+    AUTODETECT_SAMPLE_ROWS, COLUMN_ROLES, LOW_CONFIDENCE, build_export_state, calendar_filename, dump_export_state,
+    format_memory, format_size_report, generate_all, generate_views, history_options, history_size_report, list_sheets,
+    list_teachers, load_export_state, normalize_roster, profile_columns, read_roster, read_roster_cached, roster_memory,
+    write_zip,
+)
+from rooster_metrics import METRICS_ENV, RunMetrics, flame_text
+
+STATUS_FILENAME = "rooster_status.json"
+
+# --geschiedenis -> modus van history_options
+HISTORY_CHOICES = {"volledig": "full", "laatste": "window", "periode": "horizon", "uit": "off"}
+
+
+def add_history_arguments(parser):
+    """Opties voor de lesgeschiedenis in eventbeschrijvingen (ook gebruikt door rooster_feed)."""
+    parser.add_argument("--geschiedenis", choices=HISTORY_CHOICES, default="volledig",
+                        help="vorige/komende lessen in elke beschrijving: volledig (standaard), laatste "
+                             "(--lessen), periode (--dagen) of uit")
+    parser.add_argument("--lessen", type=int, default=3,
+                        help="bij --geschiedenis laatste: aantal vorige en volgende lessen (standaard 3)")
+    parser.add_argument("--dagen", type=int, default=28,
+                        help="bij --geschiedenis periode: lessen binnen zoveel dagen ervoor/erna (standaard 28)")
+    parser.add_argument("--compact", action="store_true",
+                        help="serie-overzicht één keer in de agendabeschrijving in plaats van in elk event")
+
+
+def history_from_args(args, parser):
+    """history_options uit de argumenten; ongeldige waarden via parser.error."""
+    try:
+        return history_options(HISTORY_CHOICES[args.geschiedenis], args.lessen, args.dagen, args.compact)
+    except ValueError as e:
+        parser.error(str(e))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Zet een Excel-rooster om naar ICS-agenda's per docent.")
+    parser.add_argument("excel", help="pad naar het .xlsx-rooster")
+    parser.add_argument("--blad", default=None,
+                        help="naam van het werkblad (standaard: het eerste blad)")
+    parser.add_argument("--out", help="map waarin per docent een <docent>.ics komt")
+    parser.add_argument("--zip", help="pad voor één ZIP met alle .ics-bestanden")
+    parser.add_argument("--zip-level", type=int, default=6, choices=range(10), metavar="0-9",
+                        help="ZIP-compressie: 0 = niet comprimeren, 9 = kleinst (standaard 6)")
+    parser.add_argument("--docent", action="append", default=None,
+                        help="alleen deze docent (herhaalbaar); standaard alle docenten")
+    parser.add_argument("--allen", action="store_true",
+                        help="evenementen voor 'allen' opnemen in de agenda's per docent (per groep en zaal altijd)")
+    parser.add_argument("--weergave", action="append", default=[], choices=["groep", "zaal"],
+                        help="ook agenda's per studentgroep en/of zaal (herhaalbaar), in submappen groep/ en zaal/; "
+                             "alles in één doorloop van het rooster")
+    parser.add_argument("--kolom", action="append", default=[], metavar="ROL=KOLOM",
+                        help=f"kolomtoewijzing overschrijven; rollen: {', '.join(COLUMN_ROLES)}")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="aantal parallelle processen (standaard: aantal CPU-kernen; 1 = sequentieel; "
+                             "niet bij --weergave)")
+    parser.add_argument("--vorige-status", metavar="JSON",
+                        help="exportstatus van de vorige export: alleen docenten met wijzigingen opnieuw genereren, "
+                             "met hogere SEQUENCE en annuleringen voor verdwenen lessen")
+    parser.add_argument("--status", metavar="JSON",
+                        help=f"pad voor de nieuwe exportstatus (standaard: {STATUS_FILENAME} in --out)")
+    add_history_arguments(parser)
+    parser.add_argument("--metrics", metavar="PAD",
+                        help=f"metingen per stap als JSON lines naar dit bestand ('-' = stderr; standaard ${METRICS_ENV})")
+    parser.add_argument("--debug", action="store_true",
+                        help="ook debug-meldingen, stacktraces, een tijdsoverzicht per stap en (bij een begrensde "
+                             "--geschiedenis of --compact) de besparing t.o.v. volledige geschiedenis tonen, "
+                             "plus het geheugengebruik van het rooster")
+    args = parser.parse_args(argv)
+    if not args.out and not args.zip:
+        parser.error("geef --out en/of --zip op")
+    args.history = history_from_args(args, parser)
+    return args
+
+
+def resolve_columns(df, overrides):
+    """
+    Autodetectie aangevuld met ROL=KOLOM-overrides; geeft (column_vars, fouten,
+    onzeker) met onzeker = herkende rollen met een lage zekerheid.
+    """
+    profile = profile_columns(df)
+    column_vars = dict(profile["roles"])
+    errors = []
+    for item in overrides:
+        role, sep, col = item.partition("=")
+        if not sep or role not in COLUMN_ROLES:
+            errors.append(f"Ongeldige --kolom '{item}' (verwacht ROL=KOLOM met ROL uit: {', '.join(COLUMN_ROLES)})")
+            continue
+        column_vars[role] = col
+    for role in COLUMN_ROLES:
+        if column_vars[role] not in df.columns:
+            errors.append(f"Kolom voor '{role}' niet gevonden (gevonden: {column_vars[role]!r}); gebruik --kolom.")
+    uncertain = [f"{role} -> {column_vars[role]!r} ({profile['confidence'][role]:.0%})" for role in COLUMN_ROLES
+                 if column_vars[role] == profile["roles"][role] and 0 < profile["confidence"][role] < LOW_CONFIDENCE]
+    return column_vars, errors, uncertain
+
+
+def print_warnings(warnings, debug=False):
+    for w in warnings:
+        if w["level"] == "debug" and not debug:
+            continue
+        print(f"[{w['level'].upper()}] {w['message']}", file=sys.stderr)
+        if debug and w["detail"]:
+            print(w["detail"], file=sys.stderr)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    metrics = RunMetrics(sink=args.metrics, source="cli")
+    try:
+        return run(args, metrics)
+    finally:
+        metrics.flush()
+        if args.debug and metrics.records:
+            print(flame_text(metrics.records), file=sys.stderr)
+
+
+def run(args, metrics):
+    with metrics.stage("upload") as rec:
+        with open(args.excel, "rb") as f:
+            data = f.read()
+        rec["bytes"] = len(data)
+    sheet = 0 if args.blad is None else args.blad
+    if args.blad is not None and args.blad not in list_sheets(data):
+        print(f"[FOUT] Werkblad '{args.blad}' niet gevonden (wel: {', '.join(list_sheets(data))})", file=sys.stderr)
+        return 2
+    # Kolommen herkennen op een steekproef, daarna alleen de gekozen kolommen inlezen
+    with metrics.stage("autodetect"):
+        column_vars, errors, uncertain = resolve_columns(read_roster(data, sheet, nrows=AUTODETECT_SAMPLE_ROWS),
+                                                         args.kolom)
+    for u in uncertain:
+        print(f"[WARNING] Onzeker herkend, controleer of gebruik --kolom: {u}", file=sys.stderr)
+    if errors:
+        for e in errors:
+            print(f"[FOUT] {e}", file=sys.stderr)
+        return 2
+    with metrics.stage("read") as rec:
+        df = read_roster_cached(data, sheet, list(dict.fromkeys(column_vars.values())))
+        rec["rows"] = df.shape[0]
+
+    with metrics.stage("normalize") as rec:
+        roster = normalize_roster(df, column_vars)
+        for name, seconds in roster["timings"].items():
+            metrics.record(name, seconds)
+        rec.update(rows=roster["rows"].shape[0], pairs=roster["teachers"].shape[0])
+    del df  # alleen het compacte rooster blijft bewaard
+    if args.debug:
+        print(f"[DEBUG] Geheugengebruik rooster: {format_memory(roster_memory(roster))}", file=sys.stderr)
+    warnings = list(roster["warnings"])
+    previous = None
+    if args.vorige_status:
+        try:
+            with open(args.vorige_status, "rb") as f:
+                previous = load_export_state(f.read())
+        except (OSError, ValueError) as e:
+            print(f"[FOUT] Vorige exportstatus niet te lezen: {e}", file=sys.stderr)
+            return 2
+    with metrics.stage("export_state"):
+        export_state, changes = build_export_state(roster, column_vars, previous)
+
+    if args.docent:
+        docenten = [d.strip().lower() for d in args.docent]
+    elif previous is not None:
+        # Incrementeel: alleen agenda's die door de wijzigingen geraakt worden
+        changed = changes["teachers"] | (set(list_teachers(roster)) if args.allen and changes["allen"] else set())
+        docenten = [d for d in list_teachers(roster) if d in changed]
+        docenten += sorted(d for d in changes["teachers"] - set(docenten))  # docenten zonder lessen meer
+        print(f"Wijzigingen: {len(changes['added'])} nieuw, {len(changes['changed'])} gewijzigd, "
+              f"{len(changes['removed'])} vervallen; {len(docenten)} agenda('s) opnieuw.", file=sys.stderr)
+    else:
+        docenten = list_teachers(roster)
+    teacher_stats, extra = {}, {}
+    if args.weergave:
+        # Eén doorloop voor docenten, groepen en zalen
+        with metrics.stage("generate", teachers=len(docenten), views=",".join(["docent"] + args.weergave)) as rec:
+            view_stats = {}
+            views = generate_views(roster, column_vars, ["docent"] + args.weergave, docenten, args.allen,
+                                   warnings=warnings, export_state=export_state, history=args.history,
+                                   stats=view_stats)
+            rec.update({f"{view}_calendars": s["calendars"] for view, s in view_stats.items() if view != "seconds"})
+        ics_dict = views["docent"]
+        for view in args.weergave:
+            extra.update({f"{view}/{calendar_filename(name)}": ics_bytes for name, ics_bytes in views[view].items()})
+    else:
+        with metrics.stage("generate", teachers=len(docenten), workers=args.workers):
+            ics_dict = generate_all(roster, column_vars, docenten, args.allen, warnings=warnings, workers=args.workers,
+                                    progress=lambda done, total, docent: print(f"[{done}/{total}] {docent}",
+                                                                               file=sys.stderr),
+                                    export_state=export_state, stats=teacher_stats, history=args.history)
+            metrics.record_generation(teacher_stats)
+    print_warnings(warnings, args.debug)
+    if args.debug and args.history != history_options() and teacher_stats:
+        report = history_size_report(roster, column_vars, docenten, teacher_stats, args.allen,
+                                     export_state=export_state, workers=args.workers)
+        print(f"[DEBUG] Geschiedenis {args.geschiedenis}{' compact' if args.compact else ''}: "
+              f"{format_size_report(report)}", file=sys.stderr)
+
+    if args.out:
+        with metrics.stage("write", files=len(ics_dict) + len(extra)):
+            os.makedirs(args.out, exist_ok=True)
+            for view in args.weergave:
+                os.makedirs(os.path.join(args.out, view), exist_ok=True)
+            for name, ics_bytes in {**ics_dict, **extra}.items():
+                with open(os.path.join(args.out, f"{name}.ics"), "wb") as f:
+                    f.write(ics_bytes)
+    if args.zip:
+        with metrics.stage("zip", files=len(ics_dict) + len(extra)):
+            write_zip({**ics_dict, **extra}, args.zip, args.zip_level)
+    status_path = args.status or (os.path.join(args.out, STATUS_FILENAME) if args.out else None)
+    if status_path:
+        with open(status_path, "wb") as f:
+            f.write(dump_export_state(export_state))
+
+    print(f"{len(ics_dict)} van {len(docenten)} agenda's gegenereerd."
+          + (f" Plus {len(extra)} per {' en '.join(args.weergave)}." if extra else ""))
+    return 0 if len(ics_dict) == len(docenten) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1379 @@
+"""
+Rooster Omzetter – engine zonder Streamlit.
+
+Leest een Excel-rooster, normaliseert het en genereert ICS-agenda's per docent.
+Meldingen worden als gestructureerde waarschuwingen teruggegeven in plaats van
+getoond, zodat de Streamlit-app (streamlit_app.py) en de command-line
+(rooster_cli.py) dezelfde logica delen.
+"""
+import numpy as np
+import pandas as pd
+from datetime import date, datetime, time as dt_time, timezone
+from icalendar import Calendar, Event, vText
+import zipfile
+import re
+from collections import defaultdict
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import io
+import os
+import hashlib
+import tempfile
+import importlib.util
+import json
+import sys
+from time import perf_counter
+
+from ics_writer import event_block, write_blocks, write_calendar
+
+PRODID = "-//Rooster Omzetter//NONSGML v1.0//NL"
+
+COLUMN_ROLES = ["Datum", "Van", "Tot", "Student groep", "Zaal", "Beschrijving NL", "Docenten"]
+
+# NL naam-mapping
+NL_WEEKDAYS = {
+    "Monday":"maandag","Tuesday":"dinsdag","Wednesday":"woensdag",
+    "Thursday":"donderdag","Friday":"vrijdag","Saturday":"zaterdag","Sunday":"zondag"
+}
+NL_MONTHS = {
+    "January":"januari","February":"februari","March":"maart","April":"april",
+    "May":"mei","June":"juni","July":"juli","August":"augustus",
+    "September":"september","October":"oktober","November":"november","December":"december"
+}
+
+# ===============================================================
+# WAARSCHUWINGEN
+# ===============================================================
+def add_warning(warnings, message, level="warning", detail=None):
+    """
+    Voeg een gestructureerde melding toe aan warnings (lijst of None).
+    level: 'debug' (alleen in debug-modus tonen), 'warning' of 'error'.
+    """
+    if warnings is not None:
+        warnings.append({"level": level, "message": message, "detail": detail})
+
+# ===============================================================
+# INLEZEN
+# ===============================================================
+# Aantal rijen dat voor kolomherkenning wordt ingelezen (het hele blad is daarvoor niet nodig)
+AUTODETECT_SAMPLE_ROWS = 500
+
+# Map voor de Parquet-cache van ingelezen roosters; lege string schakelt de cache uit.
+# De map is alleen voor de eigen gebruiker (0o700) en wordt begrensd op
+# ROOSTER_CACHE_DIR_MB (standaard 256): de langst niet gebruikte bestanden gaan eerst.
+ROSTER_CACHE_DIR = os.environ.get("ROOSTER_CACHE_DIR", os.path.join(tempfile.gettempdir(), "rooster_cache"))
+ROSTER_CACHE_MAX_BYTES = int(os.environ.get("ROOSTER_CACHE_DIR_MB", "256")) * 1024 * 1024
+
+def excel_engine():
+    """Snelste beschikbare Excel-backend: 'calamine' (optioneel: python-calamine) of anders 'openpyxl'."""
+    return "calamine" if importlib.util.find_spec("python_calamine") else "openpyxl"
+
+def _excel_source(file):
+    return io.BytesIO(file) if isinstance(file, (bytes, bytearray)) else file
+
+def list_sheets(file, engine=None):
+    """Namen van de werkbladen in een .xlsx (pad, bestandsobject of bytes)."""
+    with pd.ExcelFile(_excel_source(file), engine=engine or excel_engine()) as xls:
+        return xls.sheet_names
+
+def read_roster(file, sheet_name=0, usecols=None, nrows=None, engine=None):
+    """
+    Lees een .xlsx-rooster (pad, bestandsobject of bytes) in als DataFrame.
+    usecols beperkt het inlezen tot de gebruikte kolommen (namen zoals in de
+    kopregel), nrows tot de eerste rijen.
+    """
+    if usecols is not None and not all(isinstance(col, str) for col in usecols):
+        # pandas wil in usecols alleen tekst; bij een blad zonder kopregel is de
+        # 'kop' een datum of getal: dan het hele blad lezen en daarna kiezen
+        df = pd.read_excel(_excel_source(file), sheet_name=sheet_name, nrows=nrows, engine=engine or excel_engine())
+        wanted = set(usecols)
+        return df[[col for col in df.columns if col in wanted]]
+    return pd.read_excel(_excel_source(file), sheet_name=sheet_name, usecols=usecols, nrows=nrows,
+                         engine=engine or excel_engine())
+
+def _roster_cache_path(data, sheet_name, usecols, cache_dir):
+    key = hashlib.sha256(data).hexdigest()
+    key += "-" + hashlib.sha256(repr((sheet_name, sorted(usecols, key=repr) if usecols else None)).encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{key}.parquet")
+
+def _private_cache_dir(cache_dir):
+    """
+    Maak de cachemap aan met rechten alleen voor deze gebruiker (0o700) en
+    herstel die rechten op een bestaande map. False als de map van een andere
+    gebruiker is: dan wordt er niet uit gelezen en niet in geschreven.
+    """
+    os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    if hasattr(os, "getuid"):  # niet op Windows
+        st = os.stat(cache_dir)
+        if st.st_uid != os.getuid():
+            return False
+        if st.st_mode & 0o077:
+            os.chmod(cache_dir, 0o700)
+    return True
+
+def _prune_roster_cache(cache_dir, max_bytes):
+    """Verwijder de langst niet gebruikte .parquet-bestanden (op mtime) tot de map onder max_bytes zit."""
+    entries = []
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if entry.name.endswith(".parquet"):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+
+def read_roster_cached(data, sheet_name=0, usecols=None, cache_dir=None, engine=None, max_bytes=None):
+    """
+    Als read_roster (op de bytes van het bestand), met een Parquet-cache per
+    (bestandsinhoud, werkblad, kolommen). Opnieuw uploaden van hetzelfde rooster
+    leest dan de compacte kolomopslag in plaats van de Excel-XML.
+    Zonder pyarrow, of als het blad niet verliesvrij als Parquet kan (bijv. een
+    kolom met zowel tekst als tijden, of een blad zonder kopregel), wordt gewoon
+    niet op schijf gecachet.
+    Na elke nieuwe cache-entry wordt de map begrensd op max_bytes
+    (standaard ROSTER_CACHE_MAX_BYTES).
+    """
+    cache_dir = ROSTER_CACHE_DIR if cache_dir is None else cache_dir
+    max_bytes = ROSTER_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    use_cache = bool(cache_dir) and importlib.util.find_spec("pyarrow") is not None
+    if use_cache:
+        try:
+            use_cache = _private_cache_dir(cache_dir)
+        except OSError:
+            use_cache = False
+    path = _roster_cache_path(data, sheet_name, usecols, cache_dir) if use_cache else None
+    if path and os.path.exists(path):
+        try:
+            df = pd.read_parquet(path)
+            os.utime(path)  # recent gebruikt: als laatste opgeruimd
+            return df
+        except Exception:
+            pass  # beschadigd of onleesbaar: opnieuw inlezen en overschrijven
+
+    df = read_roster(data, sheet_name, usecols, engine=engine)
+    if path and all(isinstance(col, str) for col in df.columns):  # Parquet maakt van andere namen tekst
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            df.to_parquet(tmp_path)
+            if pd.read_parquet(tmp_path).equals(df):
+                os.replace(tmp_path, path)
+                _prune_roster_cache(cache_dir, max_bytes)
+        except Exception:
+            pass
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return df
+
+# ===============================================================
+# HULPFUNCTIES DATA
+# ===============================================================
+def to_dt(date_val, dayfirst=True):
+    return pd.to_datetime(date_val, dayfirst=True, errors="coerce").normalize()
+
+def dutch_date_str(ts):
+    if isinstance(ts, (pd.Timestamp, datetime)): d = ts
+    else: d = to_dt(ts)
+    if pd.isna(d): return "onbekende datum"
+    s = d.strftime("%A %d %B %Y")
+    for en, nl in NL_WEEKDAYS.items(): s = s.replace(en, nl)
+    for en, nl in NL_MONTHS.items(): s = s.replace(en, nl)
+    return s
+
+def split_docenten(docent_cell):
+    if isinstance(docent_cell, str):
+        parts = re.split(r'[\s,/;]+', docent_cell.strip())
+        return [p for p in parts if p]
+    return []
+
+def parse_dates(values):
+    """
+    Vectorized datumparsing (dayfirst). Waarden die de kolombrede parse niet
+    pakt (bijv. afwijkend formaat) krijgen per waarde een tweede kans, zoals to_dt.
+    """
+    s = pd.Series(values)
+    parsed = pd.to_datetime(s, dayfirst=True, errors="coerce")
+    retry = parsed.isna() & s.notna()
+    if retry.any():
+        parsed = parsed.astype(object)
+        parsed[retry] = [pd.to_datetime(v, dayfirst=True, errors="coerce") for v in s[retry]]
+        parsed = pd.to_datetime(parsed)
+    return parsed
+
+def parse_times(values, warnings=None):
+    """
+    Vectorized tijdparsing: tijd als timedelta sinds middernacht.
+    Tekst 'HH:MM' en tijdobjecten worden gelezen; al het andere wordt 00:00.
+    """
+    s = pd.Series(values)
+    out = pd.Series(pd.Timedelta(0), index=s.index)
+    is_str = s.map(lambda v: isinstance(v, str)).astype(bool)
+    is_time = s.map(lambda v: isinstance(v, dt_time)).astype(bool)
+    if is_str.any():
+        parsed = pd.to_datetime(s[is_str].astype(str).str.strip(), format="%H:%M", errors="coerce")
+        bad = parsed.isna()
+        if bad.any():
+            add_warning(warnings, "⚠️ Onverwacht tijdformaat aangetroffen", "debug",
+                        str(s[is_str][bad].unique().tolist()[:20]))
+        out[is_str] = (parsed - parsed.dt.normalize()).fillna(pd.Timedelta(0))
+    if is_time.any():
+        out[is_time] = [pd.Timedelta(hours=t.hour, minutes=t.minute, seconds=t.second, microseconds=t.microsecond)
+                        for t in s[is_time]]
+    other = ~(is_str | is_time)
+    if other.any():
+        add_warning(warnings, "⚠️ Tijdveld is geen tekst of tijdobject", "debug",
+                    str(sorted({type(v).__name__ for v in s[other]})))
+    return out
+
+def explode_docenten(docent_cells):
+    """
+    Vectorized split_docenten: één regel per (rij, docent) met de originele
+    schrijfwijze, geïndexeerd op het rij-label van docent_cells.
+    """
+    cells = pd.Series(docent_cells)
+    is_str = cells.map(lambda v: isinstance(v, str)).astype(bool)
+    parts = cells[is_str].astype(str).str.strip().str.split(r"[\s,/;]+", regex=True).explode()
+    return parts[parts.notna() & (parts != "")].astype(str)
+
+def sort_df_chronologically(df, column_vars, warnings=None):
+    """
+    Canonieke rijtabel: kopie van df, chronologisch gesorteerd, met vooraf
+    geparste hulpkolommen (_dt, _tstart, _dtstart, _dtend, _docenten_str, _allen_only).
+    """
+    out = df.copy()
+    out["orig_idx"] = df.index
+    out["_dt"] = parse_dates(out[column_vars["Datum"]]).to_numpy()
+    out["_tstart"] = parse_times(out[column_vars["Van"]], warnings).to_numpy()
+    day = out["_dt"].dt.normalize()
+    out["_dtstart"] = day + out["_tstart"]
+    out["_dtend"] = day + parse_times(out[column_vars["Tot"]], warnings).to_numpy()
+    out = out.sort_values(["_dt", "_tstart", column_vars["Beschrijving NL"]], kind="mergesort").reset_index(drop=True)
+
+    parts = explode_docenten(out[column_vars["Docenten"]])
+    out["_docenten_str"] = parts.groupby(level=0).agg(", ".join).reindex(out.index, fill_value="")
+    lower = parts.str.lower()
+    allen_only = (lower.groupby(level=0).size() == 1) & (lower == "allen").groupby(level=0).any()
+    out["_allen_only"] = allen_only.reindex(out.index, fill_value=False).astype(bool)
+    return out
+
+# ---- Compacte opslag ----
+# Posities passen ruim in int32; zo kosten de indexen 4 bytes per verwijzing.
+POS_DTYPE = np.int32
+_NO_POSITIONS = np.empty(0, dtype=POS_DTYPE)
+# Tekstkolommen met hooguit zoveel unieke waarden per rij worden categorical
+CATEGORY_MAX_UNIQUE = 0.5
+
+def compact_rows(rows, column_vars):
+    """
+    Compacte rijtabel: kolommen met veel herhaling (docenten, groep, zaal,
+    beschrijving, ruwe datum/tijd) als category, dus één kopie per unieke waarde
+    plus een int-code per rij. De datum/tijd-hulpkolommen zijn al datetime64
+    (int64 sinds epoch); _tstart is alleen nodig voor het sorteren en vervalt.
+    """
+    out = rows.drop(columns=["_tstart"])
+    for col in dict.fromkeys([*column_vars.values(), "_docenten_str"]):
+        values = out[col]
+        if not (values.dtype == object or pd.api.types.is_string_dtype(values)):
+            continue
+        try:
+            if values.nunique() <= len(values) * CATEGORY_MAX_UNIQUE:
+                out[col] = values.astype("category")
+        except TypeError:  # niet-hashbare celwaarden: laten zoals ze zijn
+            pass
+    return out
+
+def _column_values(values):
+    """
+    Waarden van een kolom als lijst. Bij een categorical één Python-object per
+    unieke waarde, gedeeld door alle rijen (ontbrekend wordt NaN), zodat indexen
+    die de waarden bewaren geen kopie per rij vasthouden.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = values.cat.categories.tolist() + [np.nan]  # code -1 = ontbrekend
+        return [categories[code] for code in values.cat.codes.tolist()]
+    return values.tolist()
+
+def select_records(rows, positions):
+    """
+    De rijen op positions als lijst van dicts, zoals rows.iloc[positions].to_dict("records"),
+    maar categoricals worden via hun codes opgezocht in plaats van eerst uitgepakt.
+    """
+    columns = []
+    for name in rows.columns:
+        values = rows[name]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            categories = values.cat.categories.tolist() + [np.nan]  # code -1 = ontbrekend
+            columns.append([categories[code] for code in values.cat.codes.to_numpy()[positions].tolist()])
+        else:
+            columns.append(values.iloc[positions].tolist())
+    names = rows.columns.tolist()
+    return [dict(zip(names, record)) for record in zip(*columns)]
+
+def build_teacher_index(teachers):
+    """Per docent de oplopende posities (indexarray) van zijn rijen, zonder 'allen'-only rijen."""
+    own = teachers.loc[~teachers["allen_only"].to_numpy()]
+    return {str(teacher): group.to_numpy(dtype=POS_DTYPE)
+            for teacher, group in own.groupby("teacher", observed=True, sort=False)["pos"]}
+
+def roster_memory(roster):
+    """
+    Geheugengebruik (bytes, bij benadering) per onderdeel van een genormaliseerd
+    rooster, inclusief de Python-strings erin. Voor debug-weergave.
+    """
+    def index_bytes(index):
+        keys = sys.getsizeof(index["keys"]) + sum(sys.getsizeof(k) for k in index["keys"])
+        lines = sys.getsizeof(index["lines"]) + sum(sys.getsizeof(line) for line in index["lines"] if line is not None)
+        return keys + index["positions"].nbytes + index["bounds"].nbytes + lines
+    history, series = roster["history_index"], roster["series_index"]
+    return {
+        "rows": int(roster["rows"].memory_usage(deep=True).sum()),
+        "teachers": int(roster["teachers"].memory_usage(deep=True).sum()),
+        "teacher_index": sum(a.nbytes for a in roster["teacher_index"].values())
+                         + sys.getsizeof(roster["teacher_index"]),
+        "history_index": index_bytes(history) + history["dates"].nbytes,
+        "series_index": index_bytes(series) + series["dates"].nbytes,
+    }
+
+def format_memory(memory):
+    """Eén regel tekst bij roster_memory, met het totaal voorop."""
+    parts = ", ".join(f"{name} {size / 1e6:.2f} MB" for name, size in memory.items())
+    return f"{sum(memory.values()) / 1e6:.2f} MB ({parts})"
+
+def normalize_roster(df, column_vars):
+    """
+    Eén normalisatiestap na het inlezen: de gesorteerde rijtabel, een
+    (positie, docent)-tabel en de indexen voor lesgeschiedenis en series.
+    Alles downstream leest hieruit in plaats van cellen opnieuw te parsen.
+    Meldingen uit het parsen staan in roster['warnings'], de duur per deelstap
+    (seconden) in roster['timings']. roster['stamp'] (UTC, nu) is de DTSTAMP van
+    events zonder exportstatus.
+    """
+    warnings, timings = [], {}
+    t0 = perf_counter()
+    rows = sort_df_chronologically(df, column_vars, warnings)
+    t1 = perf_counter()
+    parts = explode_docenten(rows[column_vars["Docenten"]]).str.lower()
+    teachers = pd.DataFrame({"pos": parts.index.to_numpy(), "teacher": parts.to_numpy()}).drop_duplicates()
+    teachers["allen_only"] = rows["_allen_only"].to_numpy()[teachers["pos"].to_numpy()]
+    teachers["pos"] = teachers["pos"].astype(POS_DTYPE)
+    teachers["teacher"] = teachers["teacher"].astype("category")
+    rows["_uid"] = lesson_uids(rows, column_vars)
+    rows = compact_rows(rows, column_vars)
+    t2 = perf_counter()
+    history_index = build_lesson_history_index(rows, teachers, column_vars)
+    t3 = perf_counter()
+    series_index = build_series_index(rows, column_vars)
+    timings.update(sort=t1 - t0, teachers=t2 - t1, history_index=t3 - t2, series_index=perf_counter() - t3)
+    teachers = teachers.reset_index(drop=True)
+    return {
+        "rows": rows,
+        "teachers": teachers,
+        "teacher_index": build_teacher_index(teachers),
+        "history_index": history_index,
+        "series_index": series_index,
+        "warnings": warnings,
+        "timings": timings,
+        "stamp": datetime.now(timezone.utc).replace(microsecond=0),
+    }
+
+def list_teachers(roster):
+    """Alle docenten (lowercase, gesorteerd) die in het rooster voorkomen."""
+    return sorted(roster["teachers"]["teacher"].unique())
+
+def teacher_positions(roster, docent):
+    """
+    Oplopende posities in roster['rows'] met deze docent (zonder 'allen'-only
+    rijen): een indexarray in het gedeelde rooster, geen kopie van de rijen.
+    """
+    return roster["teacher_index"].get(docent.lower(), _NO_POSITIONS)
+
+# ---- Serie-sleutel uit beschrijving (heuristisch) ----
+_SERIES_RX = re.compile(r'\b([ivxlcdm]+|\d+)\b$', re.IGNORECASE)
+
+def series_key_from_desc(desc: str) -> str:
+    """
+    Maak een serie-sleutel op basis van de beschrijving:
+    - lowercase
+    - verwijder eventueel trailing nummer of Romeins cijfer (I, II, III, IV, V, ...)
+    - trim spaties
+    Voorbeeld: "Anamnesetraining 5" -> "anamnesetraining"
+    """
+    if not isinstance(desc, str):
+        return ""
+    s = desc.strip().lower()
+    # strip één trailing nummer/romeins cijfer
+    s = _SERIES_RX.sub("", s).strip()
+    # normaliseer dubbele spaties
+    s = re.sub(r'\s+', ' ', s)
+    return s
+
+def _grouped_positions(keys, positions):
+    """
+    Platte index: de posities per sleutel achter elkaar in één int32-array.
+    Geeft ({sleutel: nummer}, posities, grenzen); de posities van sleutel i
+    zijn posities[grenzen[i]:grenzen[i + 1]], een view en geen kopie.
+    Binnen een sleutel blijft de volgorde van aanleveren behouden.
+    """
+    numbers = {}
+    ids = np.fromiter((numbers.setdefault(key, len(numbers)) for key in keys), dtype=np.int64)
+    order = np.argsort(ids, kind="stable")
+    bounds = np.zeros(len(numbers) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(ids, minlength=len(numbers)), out=bounds[1:])
+    return numbers, np.asarray(positions, dtype=POS_DTYPE)[order], bounds
+
+def _positions_for(index, key):
+    """Posities (view) voor key in een index van _grouped_positions; TypeError bij een niet-hashbare sleutel."""
+    number = index["keys"].get(key)
+    if number is None:
+        return _NO_POSITIONS
+    return index["positions"][index["bounds"][number]:index["bounds"][number + 1]]
+
+def build_series_index(df_sorted, column_vars):
+    """
+    Bereken de serie-sleutels één keer per (chronologisch gesorteerd) rooster.
+    Sleutel: (serie-sleutel, groep) -> oplopende posities in df_sorted (zie
+    _positions_for), met in 'dates' de datum per positie in dezelfde volgorde.
+    Rijen zonder geldige datum vallen nooit in 'komend' en worden overgeslagen.
+    """
+    keys, key_positions = [], []
+    lines = [None] * len(df_sorted)
+    columns = [_column_values(df_sorted[col]) for col in (column_vars["Beschrijving NL"],
+                                                          column_vars["Student groep"], "_docenten_str",
+                                                          column_vars["Zaal"])]
+    for pos, (desc, group, teacher_str, zaal, dt) in enumerate(zip(*columns, df_sorted["_dt"])):
+        if pd.isna(dt) or group is None or not _is_self_equal(group):
+            continue
+        key = (series_key_from_desc(str(desc)), group)
+        try:
+            hash(key)
+        except TypeError:  # niet-hashbare celwaarde
+            continue
+        keys.append(key); key_positions.append(pos)
+        lines[pos] = f"{dutch_date_str(dt)} – {str(desc).strip()} – {teacher_str or 'onbekend'} (lokaal: {zaal})"
+    numbers, positions, bounds = _grouped_positions(keys, key_positions)
+    dates = df_sorted["_dt"].to_numpy(dtype="datetime64[ns]")[positions]
+    return {"keys": numbers, "positions": positions, "bounds": bounds, "dates": dates, "lines": lines}
+
+def get_future_series_teachers(row, series_index, column_vars, limit=None, horizon=None):
+    """
+    Voor dezelfde SERIE (op basis van serie-sleutel) + zelfde groep:
+    toon toekomstige lessen (na dit event), met datum, beschrijving en docent(en).
+    limit: hooguit zoveel (unieke) lessen; horizon: alleen tot zo lang (Timedelta) na dit event.
+    """
+    cur_dt = row.get("_dt")
+    if pd.isna(cur_dt):
+        cur_dt = pd.to_datetime(row[column_vars["Datum"]], dayfirst=True, errors="coerce")
+    if pd.isna(cur_dt):
+        return []
+
+    cur_key = series_key_from_desc(row[column_vars["Beschrijving NL"]])
+    try:
+        number = series_index["keys"].get((cur_key, row[column_vars["Student groep"]]))
+    except TypeError:  # niet-hashbare celwaarde
+        return []
+    if number is None:
+        return []
+    start, stop = series_index["bounds"][number], series_index["bounds"][number + 1]
+    dates, positions = series_index["dates"][start:stop], series_index["positions"][start:stop]
+
+    end = len(dates) if horizon is None else dates.searchsorted((cur_dt + horizon).to_datetime64(), "right")
+    lines, seen = [], set()
+    for pos in positions[dates.searchsorted(cur_dt.to_datetime64(), "right"):end].tolist():
+        line = series_index["lines"][pos]
+        if line not in seen:
+            if limit is not None and len(lines) >= limit:
+                break
+            seen.add(line)
+            lines.append(line)
+    return lines
+
+# Kolomprofiel: per kolom één keer een steekproef, daarop gevectoriseerde
+# "past dit bij een rol"-percentages; de rollen worden in één keer toegewezen.
+_DATE_RX = r"\d{1,2}[-/.]\d{1,2}[-/.]\d{2,4}|\d{4}-\d{1,2}-\d{1,2}(?:[ T]\d{1,2}:\d{2}(?::\d{2})?)?"
+_TIME_RX = r"\d{1,2}:\d{2}(?::\d{2})?"
+_NAMES_RX = r"[^\W\d_][\w'.-]*(?:[\s,/;]+[^\W\d_][\w'.-]*){0,5}"  # 1–6 namen, gescheiden zoals split_docenten
+_GROUP_RX = r"[^\W\d_]{1,8}[-_ ]?\d{1,2}[^\W\d_]{0,2}(?:[-_ ]?\w{1,4})?"  # bijv. CRIM-1A
+_ROOM_RX = r"[^\W\d_]{0,4}[ .-]?\d{1,3}(?:\.\d{1,3})+[^\W\d_]?"  # bijv. B.1.12
+
+ROLE_HINTS = {
+    "Datum": ("datum", "date", "dag"),
+    "Van": ("van", "start", "begin"),
+    "Tot": ("tot", "eind", "end"),
+    "Student groep": ("groep", "klas", "group", "cohort"),
+    "Zaal": ("zaal", "lokaal", "ruimte", "locatie", "room"),
+    "Beschrijving NL": ("beschrijving", "omschrijving", "activiteit", "description", "vak"),
+    "Docenten": ("docent", "leraar", "teacher", "medewerker"),
+}
+ROLE_CONTENT = {"Datum": "date", "Van": "time", "Tot": "time", "Student groep": "group", "Zaal": "room",
+                "Beschrijving NL": "text", "Docenten": "names"}
+MIN_ROLE_SCORE = 0.2
+LOW_CONFIDENCE = 0.5  # daaronder vraagt de UI/CLI om de kolomkeuze te controleren
+
+def _profile_column(values):
+    """Kenmerken van één kolom (steekproef): vulgraad, cardinaliteit en parse-percentages per soort."""
+    s = values.dropna()
+    n = len(s)
+    stats = {"fill": round(n / len(values), 3) if len(values) else 0.0, "cardinality": int(s.nunique()),
+             "unique": round(s.nunique() / n, 3) if n else 0.0}
+    if not n:
+        return dict(stats, mean_len=0.0, date=0.0, time=0.0, names=0.0, group=0.0, room=0.0, text=0.0)
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return dict(stats, mean_len=0.0, date=1.0, time=0.0, names=0.0, group=0.0, room=0.0, text=0.0)
+    types = s.map(type)
+    is_str = (types == str).to_numpy()
+    strs = s[is_str].astype(str).str.strip()
+    date_obj = types.isin([datetime, pd.Timestamp, date]).sum()
+
+    def rate(mask_sum):
+        return round(float(mask_sum) / n, 3)
+    is_date = strs.str.fullmatch(_DATE_RX)
+    is_time = strs.str.fullmatch(_TIME_RX)
+    lengths = strs.str.len()
+    return dict(
+        stats,
+        mean_len=round(float(lengths.mean()), 1) if len(strs) else 0.0,
+        date=rate(date_obj + is_date.sum()),
+        time=rate((types == dt_time).sum() + is_time.sum()),
+        names=rate(strs.str.fullmatch(_NAMES_RX).sum()),
+        group=rate(strs.str.fullmatch(_GROUP_RX).sum()),
+        room=rate(strs.str.fullmatch(_ROOM_RX).sum()),
+        text=rate((strs.str.contains(r"[^\W\d_]", regex=True) & ~is_date & ~is_time).sum()),
+    )
+
+def _header_score(column, role):
+    name = str(column).strip().lower()
+    for hint in ROLE_HINTS[role]:
+        if name == hint:
+            return 1.0
+        if re.search(rf"\b{hint}", name):
+            return 0.8
+    return 0.0
+
+def _content_score(stats, role):
+    score = stats[ROLE_CONTENT[role]]
+    if role == "Beschrijving NL":
+        score *= min(1.0, stats["mean_len"] / 12)  # beschrijvingen zijn langer dan namen of codes
+    elif role == "Docenten":
+        score *= 1.0 if stats["mean_len"] <= 24 else 0.5
+    return score * min(1.0, stats["fill"] * 2)  # (bijna) lege kolommen tellen nauwelijks
+
+def profile_columns(df, sample_rows=AUTODETECT_SAMPLE_ROWS):
+    """
+    Profiel van alle kolommen en een voorstel voor alle rollen in één keer.
+    Per kolom wordt een steekproef (eerste sample_rows rijen) één keer bekeken:
+    vulgraad, cardinaliteit en het deel van de waarden dat parseert als datum,
+    tijd, namenlijst, groepscode, zaalcode of tekst. Score per (rol, kolom) is
+    inhoud (55%) plus kolomnaam (45%); rollen worden gretig op hoogste score
+    verdeeld, elke kolom hooguit één keer.
+    Geeft {"columns": {kolom: kenmerken}, "roles": {rol: kolom of None},
+    "confidence": {rol: 0..1}} terug.
+    """
+    sample = df.head(sample_rows)
+    columns = {col: _profile_column(sample[col]) for col in sample.columns}
+    scores = sorted(
+        ((0.55 * _content_score(stats, role) + 0.45 * _header_score(col, role), role, col)
+         for col, stats in columns.items() for role in COLUMN_ROLES),
+        key=lambda item: -item[0],
+    )
+    roles, confidence, used = dict.fromkeys(COLUMN_ROLES), dict.fromkeys(COLUMN_ROLES, 0.0), set()
+    for score, role, col in scores:
+        if score < MIN_ROLE_SCORE:
+            break
+        if roles[role] is None and col not in used:
+            roles[role], confidence[role] = col, round(score, 2)
+            used.add(col)
+
+    # Van/Tot op inhoud rechtzetten als de kolomnamen het niet beslissen
+    van, tot = roles["Van"], roles["Tot"]
+    if van is not None and tot is not None and _header_score(van, "Van") == _header_score(tot, "Van"):
+        start, end = parse_times(sample[van]), parse_times(sample[tot])
+        if (end < start).mean() > 0.5:
+            roles["Van"], roles["Tot"] = tot, van
+    return {"columns": columns, "roles": roles, "confidence": confidence}
+
+def autodetect_columns(df):
+    """Voorstel voor alle kolomrollen (COLUMN_ROLES); None waar niets gevonden is."""
+    return profile_columns(df)["roles"]
+
+def _is_self_equal(val):
+    """False voor NaN/NaT-achtige waarden (die via == nooit met zichzelf matchen)."""
+    try:
+        return bool(val == val)
+    except Exception:
+        return False
+
+def build_lesson_history_index(df_sorted, teachers, selected_columns):
+    """
+    Bouw één keer per (chronologisch gesorteerd) rooster een index voor get_lesson_history.
+    Sleutel: (docent, groep, beschrijving, alleen_allen) -> oplopende posities in df_sorted.
+    Beschrijving None staat voor 'alle beschrijvingen' van die docent + groep.
+    teachers is de (pos, teacher, allen_only)-tabel uit normalize_roster.
+    """
+    groups = _column_values(df_sorted[selected_columns["Student groep"]])
+    descs = _column_values(df_sorted[selected_columns["Beschrijving NL"]])
+    lines = [f"{desc} , {dutch_date_str(dt)}" for desc, dt in zip(descs, df_sorted["_dt"])]
+    keys, key_positions = [], []
+    for pos, teacher, allen_only in zip(teachers["pos"].tolist(), _column_values(teachers["teacher"]),
+                                        teachers["allen_only"].tolist()):
+        group, desc = groups[pos], descs[pos]
+        if not _is_self_equal(group):
+            continue
+        try:
+            hash(group)
+        except TypeError:  # niet-hashbare celwaarde
+            continue
+        keys.append((teacher, group, None, bool(allen_only))); key_positions.append(pos)
+        if desc is not None and _is_self_equal(desc):
+            keys.append((teacher, group, desc, bool(allen_only))); key_positions.append(pos)
+    numbers, positions, bounds = _grouped_positions(keys, key_positions)
+    return {"keys": numbers, "positions": positions, "bounds": bounds, "lines": lines,
+            "dates": df_sorted["_dt"].to_numpy(dtype="datetime64[ns]")}
+
+def _nearest_positions(selected, history_index, current_pos, backwards, limit, horizon):
+    """
+    Posities uit selected vanaf de les die het dichtst bij current_pos ligt, tot
+    limit unieke regels of tot buiten de horizon; weer in oplopende volgorde.
+    """
+    lines, dates = history_index["lines"], history_index["dates"]
+    cur_dt = dates[current_pos]
+    horizon = None if horizon is None else pd.Timedelta(horizon).to_timedelta64()
+    out, seen = [], set()
+    for p in (reversed(selected) if backwards else selected):
+        if horizon is not None and not abs(dates[p] - cur_dt) <= horizon:  # NaT valt er ook buiten
+            break
+        if limit is not None and lines[p] not in seen and len(seen) >= limit:
+            break
+        seen.add(lines[p])
+        out.append(p)
+    return out[::-1] if backwards else out
+
+def get_lesson_history(history_index, docent, group, current_pos, history_type, current_desc=None, allen_only=False,
+                       limit=None, horizon=None):
+    """
+    Vorige/toekomstige lessen voor dezelfde docent + groep, optioneel
+    beperkt tot dezelfde beschrijving (current_desc).
+    current_pos is de positie in het rooster waarop history_index is gebouwd.
+    limit: alleen de dichtstbijzijnde zoveel (unieke) lessen; horizon: alleen
+    lessen binnen zo lang (Timedelta) voor/na de huidige.
+    """
+    docent_l = (docent or "").strip().lower()
+    try:
+        key_positions = _positions_for(history_index, (docent_l, group, current_desc, allen_only))
+    except TypeError:  # niet-hashbare celwaarde
+        return []
+    cut = key_positions.searchsorted(current_pos)
+    if history_type == "previous":
+        selected = key_positions[:cut].tolist()
+    else:
+        selected = (key_positions[cut + 1:] if cut < len(key_positions) and key_positions[cut] == current_pos
+                    else key_positions[cut:]).tolist()
+    if limit is not None or horizon is not None:
+        selected = _nearest_positions(selected, history_index, current_pos, history_type == "previous", limit, horizon)
+    lines = history_index["lines"]
+    seen, uniq = set(), []
+    for p in selected:
+        x = lines[p]
+        if x not in seen:
+            seen.add(x); uniq.append(x)
+    return uniq
+
+# ===============================================================
+# EXPORTSTATUS (UID / SEQUENCE)
+# ===============================================================
+UID_DOMAIN = "rooster-omzetter"
+
+def lesson_uids(df_sorted, column_vars):
+    """
+    Deterministische UID per logische les: groep + beschrijving, plus het
+    volgnummer van de les binnen die sleutel (in chronologische volgorde).
+    Genummerde lessen ("Anamnesetraining 3") zijn daarmee al uniek; terugkerende
+    lessen met steeds dezelfde beschrijving ("Intervisie") tellen op. Datum, tijd,
+    zaal en docenten horen er bewust niet bij: een les die naar een andere dag of
+    tijd verschuift houdt zijn UID en krijgt een hogere SEQUENCE in plaats van een
+    dubbel event. (Een extra of vervallen les midden in een terugkerende reeks
+    verschuift de volgnummers erna; die lessen krijgen dan een hogere SEQUENCE.)
+    """
+    seen = defaultdict(int)
+    uids = []
+    for group, desc in zip(df_sorted[column_vars["Student groep"]], df_sorted[column_vars["Beschrijving NL"]]):
+        key = f"{group}\x1f{desc}"
+        n = seen[key]; seen[key] += 1
+        uids.append(hashlib.sha1(f"{key}\x1f{n}".encode("utf-8")).hexdigest()[:24] + "@" + UID_DOMAIN)
+    return uids
+
+def _lesson_fingerprint(row, column_vars):
+    return hashlib.sha1(repr((
+        str(row["_dtstart"]), str(row["_dtend"]), str(row[column_vars["Zaal"]]), row["_docenten_str"],
+    )).encode("utf-8")).hexdigest()
+
+def build_export_state(roster, column_vars, previous=None):
+    """
+    Exportstatus van dit rooster, afgeleid van de vorige (of None bij de eerste export).
+    Per UID: vingerafdruk (tijd, zaal, docenten), SEQUENCE, status en 'stamp'
+    (DTSTAMP: wanneer de les voor het laatst veranderde). Gewijzigde lessen krijgen
+    SEQUENCE + 1; verdwenen lessen worden 'cancelled' met SEQUENCE + 1. Lessen in
+    een serie (+ groep) waarin iets veranderde krijgen ook SEQUENCE + 1, want hun
+    beschrijving (vorige/komende lessen) verandert mee.
+    Verdwijnt een gewijzigde les uit een agenda (andere docent, groep of zaal),
+    dan staat dat in 'dropped' (zie _dropped_calendars).
+    Geeft (status, wijzigingen) terug; wijzigingen bevat de sets 'added', 'changed',
+    'removed', 'refreshed' (alleen de beschrijving is anders), 'teachers' (docenten
+    met gewijzigde agenda) en 'allen' (bool).
+    De status is JSON-serialiseerbaar (zie dump_export_state/load_export_state).
+    """
+    prev_events = (previous or {}).get("events", {})
+    revision = (previous or {}).get("revision", -1) + 1
+    stamp = datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+    rows = roster["rows"]
+    pairs = roster["teachers"]
+    teachers_by_pos = defaultdict(list)
+    for pos, teacher in zip(pairs["pos"], pairs["teacher"]):
+        teachers_by_pos[pos].append(teacher)
+
+    events, changes = {}, {"added": set(), "changed": set(), "removed": set(), "refreshed": set(), "teachers": set(),
+                           "allen": False}
+    touched_series = set()
+    for pos, row in enumerate(select_records(rows, slice(None))):
+        if pd.isna(row["_dtstart"]):
+            continue
+        uid = row["_uid"]
+        entry = {
+            "fp": _lesson_fingerprint(row, column_vars),
+            "seq": 0, "status": "active", "revision": revision, "stamp": stamp,
+            "teachers": teachers_by_pos[pos], "allen_only": bool(row["_allen_only"]),
+            "series": [series_key_from_desc(row[column_vars["Beschrijving NL"]]),
+                       str(row[column_vars["Student groep"]])],
+            "summary": f"{row[column_vars['Beschrijving NL']]} - {row['_docenten_str']}",
+            "dtstart": row["_dtstart"].isoformat(), "dtend": row["_dtend"].isoformat(),
+            "room": _view_name(row[column_vars["Zaal"]]),
+        }
+        old = prev_events.get(uid)
+        if old is None:
+            if previous is not None:
+                changes["added"].add(uid)
+        elif old["fp"] != entry["fp"] or old["status"] != "active":
+            entry["seq"] = old["seq"] + 1
+            changes["changed"].add(uid)
+            dropped = _dropped_calendars(old, entry) if old["status"] == "active" else None
+            if dropped:
+                entry["dropped"] = dropped
+        else:
+            entry["seq"], entry["revision"], entry["stamp"] = old["seq"], old["revision"], old.get("stamp", stamp)
+        if uid in changes["added"] or uid in changes["changed"]:
+            changes["teachers"].update(entry["teachers"] if not entry["allen_only"] else [])
+            changes["allen"] |= entry["allen_only"]
+            touched_series.add(tuple(entry["series"]))
+            if old is not None:
+                changes["teachers"].update(old["teachers"] if not old["allen_only"] else [])
+        events[uid] = entry
+
+    for uid, old in prev_events.items():
+        if uid in events:
+            continue
+        if old["status"] == "active":
+            old = dict(old, seq=old["seq"] + 1, status="cancelled", revision=revision, stamp=stamp)
+            changes["removed"].add(uid)
+            changes["teachers"].update(old["teachers"] if not old["allen_only"] else [])
+            changes["allen"] |= old["allen_only"]
+            touched_series.add(tuple(old["series"]))
+        events[uid] = old
+
+    # Vorige/komende lessen en 'Andere lessen in deze serie' (ook van collega's)
+    # komen allemaal uit dezelfde serie (+ groep): verandert daar iets, dan
+    # verandert de beschrijving van elke les erin. Die krijgen een hogere
+    # SEQUENCE, anders negeren agenda-apps de nieuwe beschrijving.
+    if touched_series:
+        for uid, entry in events.items():
+            if entry["status"] != "active" or tuple(entry["series"]) not in touched_series:
+                continue
+            if entry["allen_only"]:
+                changes["allen"] = True
+            else:
+                changes["teachers"].update(entry["teachers"])
+            if entry["revision"] != revision:
+                entry.update(seq=entry["seq"] + 1, revision=revision, stamp=stamp)
+                changes["refreshed"].add(uid)
+
+    return {"version": 1, "revision": revision, "events": events}, changes
+
+def _dropped_calendars(old, entry):
+    """
+    Agenda's waar een gewijzigde les uit verdwijnt: docenten die hem niet meer
+    geven en de vorige zaal ('teachers', 'zaal'), met de les zoals die agenda's
+    hem kenden. Zij krijgen een annulering; anders blijft er na opnieuw
+    importeren een spookles staan. Leeg als er niets verdwijnt. (Een andere groep
+    is een andere UID, dus al een annulering plus een nieuwe les.) Van en naar
+    'allen' telt niet voor docenten: wie 'allen' meeneemt, houdt de les.
+    """
+    dropped = {}
+    if not old["allen_only"] and not entry["allen_only"]:
+        teachers = sorted(set(old["teachers"]) - set(entry["teachers"]))
+        if teachers:
+            dropped["teachers"] = teachers
+    if old.get("room") is not None and old["room"] != entry["room"]:
+        dropped["zaal"] = old["room"]
+    if dropped:
+        dropped.update(summary=old["summary"], dtstart=old["dtstart"], dtend=old["dtend"])
+    return dropped
+
+def _entry_stamp(entry, default=None):
+    """DTSTAMP (UTC) van een entry uit de exportstatus; default voor een status zonder 'stamp'."""
+    return datetime.fromisoformat(entry["stamp"]) if "stamp" in entry else default
+
+def dump_export_state(state):
+    """Exportstatus als JSON-bytes (om mee te geven aan de volgende export)."""
+    return json.dumps(state, ensure_ascii=False, sort_keys=True).encode("utf-8")
+
+def load_export_state(data):
+    """Exportstatus uit JSON (bytes of str), zoals geschreven door dump_export_state."""
+    state = json.loads(data)
+    if not isinstance(state, dict) or state.get("version") != 1 or "events" not in state:
+        raise ValueError("geen geldige exportstatus (verwacht versie 1)")
+    return state
+
+def _cancelled_events(export_state, docent, allen_only):
+    """
+    Annuleringen (STATUS:CANCELLED) uit de laatste revisie voor deze docent of
+    voor 'allen', inclusief lessen die deze docent niet meer geeft.
+    """
+    docent_l = docent.lower()
+    return _cancelled_matching(export_state, lambda entry: entry["allen_only"] == allen_only and (
+        allen_only or docent_l in entry["teachers"]),
+        None if allen_only else lambda dropped: docent_l in dropped.get("teachers", ()))
+
+def _cancelled_matching(export_state, match, dropped=None):
+    """
+    Annuleringen uit de laatste revisie waarvoor match(entry) waar is, plus
+    (met dropped) gewijzigde lessen waarvoor dropped(entry['dropped']) waar is:
+    die bestaan nog, maar niet meer in deze agenda.
+    """
+    for uid, entry in export_state["events"].items():
+        if entry["revision"] != export_state["revision"]:
+            continue
+        if entry["status"] == "cancelled" and match(entry):
+            source = entry
+        elif dropped is not None and entry.get("dropped") and dropped(entry["dropped"]):
+            source = entry["dropped"]
+        else:
+            continue
+        yield {
+            "uid": uid, "sequence": entry["seq"], "status": "CANCELLED", "dtstamp": _entry_stamp(entry),
+            "summary": source["summary"],
+            "dtstart": datetime.fromisoformat(source["dtstart"]), "dtend": datetime.fromisoformat(source["dtend"]),
+        }
+
+# ===============================================================
+# LESGESCHIEDENIS IN BESCHRIJVINGEN
+# ===============================================================
+# Elke les noemt standaard alle vorige/komende lessen van de reeks; per agenda
+# groeit de beschrijvingstekst daardoor kwadratisch met de lengte van een reeks.
+HISTORY_MODES = ("full", "window", "horizon", "off")
+
+def history_options(mode="full", count=3, days=28, compact=False):
+    """
+    Instellingen voor de lesgeschiedenis in eventbeschrijvingen:
+    - 'full':    alle vorige en komende lessen (standaard, zoals altijd)
+    - 'window':  alleen de laatste/volgende `count` lessen
+    - 'horizon': alleen lessen binnen `days` dagen voor/na de les
+    - 'off':     geen lesgeschiedenis en geen serie-overzicht
+    compact: het serie-overzicht (lessen van collega's) één keer in de
+    agendabeschrijving in plaats van in elk event; events verwijzen ernaar.
+    """
+    if mode not in HISTORY_MODES:
+        raise ValueError(f"onbekende geschiedenis-modus {mode!r} (kies uit: {', '.join(HISTORY_MODES)})")
+    if mode == "window" and count < 1 or mode == "horizon" and days < 0:
+        raise ValueError("aantal lessen moet minstens 1 zijn en het aantal dagen niet negatief")
+    return {"mode": mode, "count": int(count), "days": int(days), "compact": bool(compact)}
+
+def _history_limits(history):
+    """(limit, horizon) voor get_lesson_history/get_future_series_teachers; None = onbegrensd."""
+    mode = (history or {}).get("mode", "full")
+    if mode == "window":
+        return history["count"], None
+    if mode == "horizon":
+        return None, pd.Timedelta(days=history["days"])
+    return None, None
+
+def _series_label(row, column_vars):
+    return f"{series_key_from_desc(row[column_vars['Beschrijving NL']])} – {row[column_vars['Student groep']]}"
+
+def series_overview(roster, column_vars, positions):
+    """
+    Tekst met alle lessen (datum, beschrijving, docenten, zaal) van elke serie
+    (+ groep) waar de rijen op positions in vallen, voor de agendabeschrijving
+    in compacte modus. Series met maar één les worden overgeslagen; None als er
+    niets te tonen is.
+    """
+    series_index, rows = roster["series_index"], roster["rows"]
+    descs = rows[column_vars["Beschrijving NL"]].to_numpy()[positions]
+    groups = rows[column_vars["Student groep"]].to_numpy()[positions]
+    blocks, seen = [], set()
+    for desc, group in zip(descs, groups):
+        try:
+            key = (series_key_from_desc(desc), group)
+            if key in seen:
+                continue
+            seen.add(key)
+            series_positions = _positions_for(series_index, key)
+        except TypeError:  # niet-hashbare celwaarde
+            continue
+        if len(series_positions) > 1:
+            lines = list(dict.fromkeys(series_index["lines"][p] for p in series_positions))
+            blocks.append(f"Serie {key[0]} – {group}:\n" + "\n".join(lines))
+    return "\n\n".join(blocks) or None
+
+def _calendar_description(docent, roster, column_vars, include_allen, allen_inclusion, history, stats):
+    """Agendabeschrijving (serie-overzicht) in compacte modus, anders None."""
+    if not (history or {}).get("compact") or history["mode"] == "off":
+        return None
+    positions = list(teacher_positions(roster, docent))
+    if include_allen:
+        rows = roster["rows"]
+        for pos in rows["_allen_only"].to_numpy().nonzero()[0]:
+            if allen_inclusion is None or allen_inclusion.get(rows["orig_idx"].iat[pos], True):
+                positions.append(pos)
+    description = series_overview(roster, column_vars, sorted(positions))
+    if stats is not None and description:
+        stats["description_bytes"] = stats.get("description_bytes", 0) + len(description.encode("utf-8"))
+    return description
+
+# ===============================================================
+# ICS-GENERATIE
+# ===============================================================
+def _build_event(row, base_pos, history_docent, roster, column_vars, allen_only=False, location=None, stats=None,
+                 history=None):
+    """
+    Eventvelden (summary, dtstart, dtend, description) voor één rij van roster['rows'].
+    location vervangt desgewenst de zaal uit het rooster; stats telt de tijd voor
+    het opzoeken van lesgeschiedenis en series op in stats['history_seconds'].
+    history: optioneel history_options(); standaard de volledige geschiedenis.
+    history_docent None is voor agenda's per groep of zaal: de docenten komen in
+    de beschrijving en vorige/toekomstige lessen (per docent) vervallen.
+    """
+    if pd.isna(row["_dtstart"]) or pd.isna(row["_dtend"]):
+        raise ValueError(f"ongeldige datum: {row[column_vars['Datum']]!r}")
+
+    description = f"{row[column_vars['Beschrijving NL']]} - Groep: {row[column_vars['Student groep']]}"
+    description += f"\nLokaal: {row[column_vars['Zaal']] if location is None else location}"
+    if history_docent is None:
+        description += f"\nDocenten: {row['_docenten_str'] or 'onbekend'}"
+
+    history = history or {}
+    if history.get("mode") != "off":
+        limit, horizon = _history_limits(history)
+        current_desc = row[column_vars["Beschrijving NL"]]
+        t0 = perf_counter() if stats is not None else None
+        prev_lessons = fut_lessons = None
+        if history_docent is not None:
+            prev_lessons = get_lesson_history(roster["history_index"], history_docent,
+                                              row[column_vars["Student groep"]], base_pos, "previous", current_desc,
+                                              allen_only=allen_only, limit=limit, horizon=horizon)
+            fut_lessons  = get_lesson_history(roster["history_index"], history_docent,
+                                              row[column_vars["Student groep"]], base_pos, "future", current_desc,
+                                              allen_only=allen_only, limit=limit, horizon=horizon)
+        if prev_lessons: description += "\n\nVorige lessen:\n" + "\n".join(prev_lessons)
+        if fut_lessons:  description += "\n\nToekomstige lessen:\n" + "\n".join(fut_lessons)
+
+        compact = history.get("compact", False)
+        serie_future = get_future_series_teachers(row, roster["series_index"], column_vars,
+                                                  limit=1 if compact else limit, horizon=horizon)
+        if stats is not None:
+            stats["history_seconds"] += perf_counter() - t0
+        if serie_future and compact:
+            description += f"\n\nAndere lessen in deze serie: zie de agendabeschrijving " \
+                           f"(serie {_series_label(row, column_vars)})."
+        elif serie_future:
+            description += "\n\nAndere lessen in deze serie (komend, met docent):\n" + "\n".join(serie_future)
+
+    return {
+        "uid": row["_uid"],
+        "summary": f"{row[column_vars['Beschrijving NL']]} - {row['_docenten_str']}",
+        "dtstart": row["_dtstart"].to_pydatetime(),
+        "dtend": row["_dtend"].to_pydatetime(),
+        "description": description,
+    }
+
+GENERATION_STATS = ["events", "cancelled", "description_bytes", "filter_seconds", "history_seconds",
+                    "build_seconds"]
+
+def iter_events(docent, roster, column_vars, include_allen=False, allen_inclusion=None, warnings=None,
+                location_overrides=None, export_state=None, stats=None, history=None):
+    """
+    Eventvelden voor één docent in agenda-volgorde (eerst de docent, dan 'allen').
+    location_overrides: optioneel {orig_idx: zaal} om de zaal per event te corrigeren.
+    export_state: optioneel (build_export_state) voor SEQUENCE en annuleringen.
+    stats: optioneel dict dat de tellers uit GENERATION_STATS bijhoudt.
+    history: optioneel history_options() voor de lesgeschiedenis in beschrijvingen.
+    Rijen die niet omgezet kunnen worden, worden overgeslagen met een melding.
+    """
+    base_sorted = roster["rows"]
+    location_overrides = location_overrides or {}
+    if stats is not None:
+        for key in GENERATION_STATS:
+            stats.setdefault(key, 0)
+
+    def build(row, base_pos, history_docent, **kwargs):
+        t0 = perf_counter() if stats is not None else None
+        event = _build_event(row, base_pos, history_docent, roster, column_vars, stats=stats, history=history,
+                             **kwargs)
+        entry = export_state["events"].get(event["uid"]) if export_state else None
+        event["sequence"] = entry["seq"] if entry else 0
+        event["dtstamp"] = _entry_stamp(entry, roster["stamp"]) if entry else roster["stamp"]
+        if stats is not None:
+            stats["build_seconds"] += perf_counter() - t0
+            stats["events"] += 1
+            stats["description_bytes"] += len(event["description"].encode("utf-8"))
+        return event
+
+    def select(positions):
+        t0 = perf_counter()
+        records = select_records(base_sorted, positions)
+        if stats is not None:
+            stats["filter_seconds"] += perf_counter() - t0
+        return records
+
+    def cancelled(history_docent, allen_only):
+        for event in _cancelled_events(export_state, history_docent, allen_only):
+            if stats is not None:
+                stats["cancelled"] += 1
+            yield event
+
+    # Docent-specifiek
+    teacher_base_pos = teacher_positions(roster, docent)
+    for pos, (base_pos, row) in enumerate(zip(teacher_base_pos, select(teacher_base_pos))):
+        try:
+            yield build(row, base_pos, docent, location=location_overrides.get(row["orig_idx"]))
+        except Exception as inner_e:
+            add_warning(warnings, f"Regel overgeslagen (pos={pos}) door fout: {inner_e}",
+                        detail=traceback.format_exc())
+    if export_state:
+        yield from cancelled(docent, allen_only=False)
+
+    # 'Allen'-regels (optioneel)
+    if include_allen:
+        allen_base_pos = base_sorted["_allen_only"].to_numpy().nonzero()[0]
+        for pos, (base_pos, row) in enumerate(zip(allen_base_pos, select(allen_base_pos))):
+            try:
+                orig_idx = row.get("orig_idx", None)
+                if allen_inclusion is not None and orig_idx is not None:
+                    if not allen_inclusion.get(orig_idx, True):
+                        continue
+                yield build(row, base_pos, "allen", allen_only=True, location=location_overrides.get(orig_idx))
+            except Exception as inner_e:
+                add_warning(warnings, f"'Allen'-regel overgeslagen (pos={pos}) door fout: {inner_e}",
+                            detail=traceback.format_exc())
+        if export_state:
+            yield from cancelled("allen", allen_only=True)
+
+def icalendar_bytes(events, description=None):
+    """Referentie-implementatie: dezelfde events via het icalendar-objectmodel."""
+    cal = Calendar()
+    cal.add("version", "2.0")
+    cal.add("prodid", PRODID)
+    if description is not None:
+        cal.add("x-wr-caldesc", vText(description))
+    for fields in events:
+        event = Event()
+        event.add("uid", fields["uid"]); event.add("sequence", fields["sequence"])
+        if fields.get("dtstamp") is not None: event.add("dtstamp", fields["dtstamp"])
+        if fields.get("status"): event.add("status", fields["status"])
+        event.add("summary", fields["summary"])
+        event.add("dtstart", fields["dtstart"]); event.add("dtend", fields["dtend"])
+        if fields.get("description") is not None: event.add("description", fields["description"])
+        cal.add_component(event)
+    return cal.to_ical()
+
+def write_ics(out, docent, roster, column_vars, include_allen=False, allen_inclusion=None, warnings=None,
+              location_overrides=None, export_state=None, stats=None, history=None):
+    """Stream de agenda van één docent direct naar out (bestand of buffer); geeft het aantal events."""
+    description = _calendar_description(docent, roster, column_vars, include_allen, allen_inclusion, history, stats)
+    return write_calendar(out, iter_events(docent, roster, column_vars, include_allen, allen_inclusion, warnings,
+                                           location_overrides, export_state, stats, history), PRODID, description)
+
+def generate_ics_bytes(docent, roster, column_vars, include_allen=False, allen_inclusion=None, warnings=None,
+                       writer="stream", location_overrides=None, export_state=None, stats=None, history=None):
+    """
+    ICS-agenda (bytes) voor één docent uit een genormaliseerd rooster (normalize_roster).
+    allen_inclusion: optioneel {orig_idx: bool} om losse 'allen'-events uit te sluiten.
+    location_overrides: optioneel {orig_idx: zaal} om de zaal per event te corrigeren.
+    export_state: optioneel (build_export_state) voor SEQUENCE en annuleringen van verdwenen lessen.
+    writer: 'stream' (ics_writer, standaard) of 'icalendar' (referentie).
+    history: optioneel history_options(); standaard de volledige lesgeschiedenis per event.
+    stats: optioneel dict; krijgt de tellers uit GENERATION_STATS plus 'seconds',
+    'serialize_seconds' (tijd buiten selecteren en opbouwen) en 'bytes'.
+    Overgeslagen regels en fouten komen als meldingen in warnings; bij een fatale
+    fout is het resultaat None.
+    """
+    t0 = perf_counter()
+    try:
+        if writer == "icalendar":
+            description = _calendar_description(docent, roster, column_vars, include_allen, allen_inclusion,
+                                                history, stats)
+            ics_bytes = icalendar_bytes(iter_events(docent, roster, column_vars, include_allen, allen_inclusion,
+                                                    warnings, location_overrides, export_state, stats, history),
+                                        description)
+        else:
+            buf = io.BytesIO()
+            write_ics(buf, docent, roster, column_vars, include_allen, allen_inclusion, warnings, location_overrides,
+                      export_state, stats, history)
+            ics_bytes = buf.getvalue()
+        if stats is not None:
+            stats["seconds"] = perf_counter() - t0
+            stats["serialize_seconds"] = max(0.0, stats["seconds"] - stats["filter_seconds"] - stats["build_seconds"])
+            stats["bytes"] = len(ics_bytes)
+        return ics_bytes
+
+    except Exception as e:
+        add_warning(warnings, f"Er is een fout opgetreden voor docent {docent}:\n{e}", "error",
+                    detail=traceback.format_exc())
+        return None
+
+# Per worker-proces één kopie van het voorbereide rooster (via de initializer,
+# dus één keer gepickled per worker in plaats van per docent).
+_WORKER_STATE = {}
+
+def _init_worker(roster, column_vars, include_allen, allen_inclusion, location_overrides, export_state, history):
+    _WORKER_STATE.update(roster=roster, column_vars=column_vars, include_allen=include_allen,
+                         allen_inclusion=allen_inclusion, location_overrides=location_overrides,
+                         export_state=export_state, history=history)
+
+def _generate_in_worker(docent):
+    warnings, stats = [], {}
+    ics_bytes = generate_ics_bytes(docent, _WORKER_STATE["roster"], _WORKER_STATE["column_vars"],
+                                   _WORKER_STATE["include_allen"], _WORKER_STATE["allen_inclusion"], warnings,
+                                   location_overrides=_WORKER_STATE["location_overrides"],
+                                   export_state=_WORKER_STATE["export_state"], stats=stats,
+                                   history=_WORKER_STATE["history"])
+    return docent, ics_bytes, warnings, stats
+
+def generate_all(roster, column_vars, docenten=None, include_allen=False, allen_inclusion=None, warnings=None,
+                 workers=1, progress=None, location_overrides=None, on_result=None, export_state=None,
+                 stats=None, history=None):
+    """
+    ICS-bytes per docent ({docent: bytes}) voor docenten (standaard: alle docenten).
+    Met workers > 1 wordt per docent parallel gegenereerd in een procespool die het
+    rooster één keer per worker ontvangt; de uitvoer is byte-gelijk aan sequentieel.
+    progress(klaar, totaal, docent) wordt aangeroepen zodra een docent af is;
+    on_result(docent, ics_bytes, meldingen) daarna per docent, in de volgorde van docenten.
+    stats: optioneel dict dat per docent de tellers van generate_ics_bytes krijgt.
+    history: optioneel history_options() (zie generate_ics_bytes).
+    Docenten waarvoor niets gegenereerd kon worden ontbreken in het resultaat.
+    """
+    docenten = list(dict.fromkeys(list_teachers(roster) if docenten is None else docenten))
+    results = {}
+    if workers <= 1 or len(docenten) <= 1:
+        for done, docent in enumerate(docenten, 1):
+            docent_warnings = []
+            docent_stats = stats.setdefault(docent, {}) if stats is not None else None
+            results[docent] = (generate_ics_bytes(docent, roster, column_vars, include_allen, allen_inclusion,
+                                                  docent_warnings, location_overrides=location_overrides,
+                                                  export_state=export_state, stats=docent_stats,
+                                                  history=history),
+                               docent_warnings)
+            if progress: progress(done, len(docenten), docent)
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(docenten)), initializer=_init_worker,
+                                 initargs=(roster, column_vars, include_allen, allen_inclusion,
+                                           location_overrides, export_state, history)) as pool:
+            futures = [pool.submit(_generate_in_worker, docent) for docent in docenten]
+            for done, fut in enumerate(as_completed(futures), 1):
+                docent, ics_bytes, docent_warnings, docent_stats = fut.result()
+                results[docent] = (ics_bytes, docent_warnings)
+                if stats is not None:
+                    stats[docent] = docent_stats
+                if progress: progress(done, len(docenten), docent)
+
+    # Vaste volgorde (die van docenten), onafhankelijk van wanneer workers klaar zijn
+    ics_dict = {}
+    for docent in docenten:
+        ics_bytes, docent_warnings = results[docent]
+        if warnings is not None:
+            warnings.extend(docent_warnings)
+        if on_result: on_result(docent, ics_bytes, docent_warnings)
+        if ics_bytes:
+            ics_dict[docent] = ics_bytes
+    return ics_dict
+
+# ===============================================================
+# AGENDA'S PER DOCENT, GROEP EN ZAAL (ÉÉN DOORLOOP)
+# ===============================================================
+VIEWS = ("docent", "groep", "zaal")
+
+def _view_name(value):
+    """Naam van een groep of zaal als agenda; None voor een lege cel."""
+    if value is None or not _is_self_equal(value):
+        return None
+    return str(value).strip() or None
+
+def calendar_filename(name):
+    """Bestandsnaam (zonder .ics) voor een agenda: tekens die in paden niet mogen worden '_'."""
+    return re.sub(r'[\\/:*?"<>|\x00-\x1f]', "_", name)
+
+def _cancelled_view_names(export_state, view, key):
+    """Groepen of zalen (view) met een annulering in de laatste revisie."""
+    names = set()
+    for entry in export_state["events"].values():
+        if entry["revision"] != export_state["revision"]:
+            continue
+        if entry["status"] == "cancelled":
+            names.add(_view_name(entry[key][1] if key == "series" else entry.get(key)))
+        names.add((entry.get("dropped") or {}).get(view))
+    names.discard(None)
+    return names
+
+def generate_views(roster, column_vars, views=VIEWS, docenten=None, include_allen=False, allen_inclusion=None,
+                   warnings=None, location_overrides=None, export_state=None, history=None, stats=None):
+    """
+    Agenda's per docent, per studentgroep en per zaal in één doorloop van het
+    gesorteerde rooster: {"docent": {docent: bytes}, "groep": {...}, "zaal": {...}}
+    voor de gevraagde views. Elke rij wordt één keer voor groep én zaal opgebouwd
+    (plus één keer per docent, want de lesgeschiedenis is per docent) en als
+    geserialiseerd VEVENT naar elke agenda gekopieerd waar hij in hoort; een
+    'allen'-event wordt één keer gedeeld door alle docenten.
+    De docent-agenda's zijn byte-gelijk aan generate_all; docenten kiest welke
+    (standaard alle). include_allen en allen_inclusion gelden alleen voor de
+    docent-agenda's: 'allen'-lessen staan altijd in hun groep en zaal (die zaal
+    is dan echt bezet). De zaal is die na location_overrides. Annuleringen gaan
+    naar docent, groep en (als de exportstatus de zaal kent) zaal, ook van
+    lessen die naar een andere docent, groep of zaal zijn gegaan.
+    stats: optioneel dict; krijgt per view {"calendars", "events", "bytes"} en 'seconds'.
+    """
+    t0 = perf_counter()
+    views = [view for view in VIEWS if view in views]
+    rows = roster["rows"]
+    location_overrides = location_overrides or {}
+    docenten = list(dict.fromkeys(list_teachers(roster) if docenten is None else (d.lower() for d in docenten)))
+    teachers_by_pos = defaultdict(list)
+    pairs = roster["teachers"]
+    for pos, teacher, allen_only in zip(pairs["pos"], pairs["teacher"], pairs["allen_only"]):
+        if not allen_only:
+            teachers_by_pos[pos].append(teacher)
+
+    blocks = {"docent": {docent: [] for docent in docenten}, "groep": defaultdict(list), "zaal": defaultdict(list)}
+    view_positions = {"groep": defaultdict(list), "zaal": defaultdict(list)}
+    allen_blocks, failed = [], set()
+
+    def build(row, pos, history_docent, **kwargs):
+        try:
+            event = _build_event(row, pos, history_docent, roster, column_vars, history=history, **kwargs)
+        except Exception as inner_e:
+            if pos not in failed:
+                failed.add(pos)
+                add_warning(warnings, f"Regel overgeslagen (pos={pos}) door fout: {inner_e}",
+                            detail=traceback.format_exc())
+            return None
+        entry = export_state["events"].get(event["uid"]) if export_state else None
+        event["sequence"] = entry["seq"] if entry else 0
+        event["dtstamp"] = _entry_stamp(entry, roster["stamp"]) if entry else roster["stamp"]
+        return event_block(event)
+
+    for pos, row in enumerate(select_records(rows, slice(None))):
+        allen_only = row["_allen_only"]
+        location = location_overrides.get(row["orig_idx"])
+        if "docent" in views:
+            if allen_only and include_allen and (allen_inclusion is None
+                                                 or allen_inclusion.get(row["orig_idx"], True)):
+                block = build(row, pos, "allen", allen_only=True, location=location)
+                if block: allen_blocks.append(block)
+            for docent in teachers_by_pos.get(pos, ()):
+                if docent in blocks["docent"]:
+                    block = build(row, pos, docent, location=location)
+                    if block: blocks["docent"][docent].append(block)
+        names = {"groep": _view_name(row[column_vars["Student groep"]]),
+                 "zaal": _view_name(row[column_vars["Zaal"]] if location is None else location)}
+        if any(names[view] for view in views if view != "docent"):
+            block = build(row, pos, None, location=location)
+            for view in views:
+                if view != "docent" and names[view] and block:
+                    blocks[view][names[view]].append(block)
+                    view_positions[view][names[view]].append(pos)
+
+    def cancelled(match, dropped):
+        if not export_state:
+            return []
+        return [event_block(event) for event in _cancelled_matching(export_state, match, dropped)]
+
+    def calendar(event_blocks, description=None):
+        buf = io.BytesIO()
+        write_blocks(buf, event_blocks, PRODID, description)
+        return buf.getvalue()
+
+    compact = (history or {}).get("compact") and history["mode"] != "off"
+    result = {}
+    for view in views:
+        out = result[view] = {}
+        if view == "docent":
+            shared = allen_blocks + cancelled(lambda entry: entry["allen_only"], None) if include_allen else []
+            for docent in docenten:
+                out[docent] = calendar(blocks[view][docent] + cancelled(
+                    lambda entry: not entry["allen_only"] and docent in entry["teachers"],
+                    lambda dropped: docent in dropped.get("teachers", ())) + shared,
+                    _calendar_description(docent, roster, column_vars, include_allen, allen_inclusion, history, None))
+            continue
+        key = "series" if view == "groep" else "room"
+        # Ook een groep of zaal zonder lessen meer krijgt een agenda, met alleen de annuleringen
+        names = set(blocks[view]) | _cancelled_view_names(export_state, view, key) if export_state else blocks[view]
+        for name in sorted(names):
+            description = series_overview(roster, column_vars, view_positions[view][name]) if compact else None
+            out[name] = calendar(blocks[view][name] + cancelled(
+                lambda entry: _view_name(entry[key][1] if key == "series" else entry.get(key)) == name,
+                lambda dropped: dropped.get(view) == name), description)
+    if stats is not None:
+        for view in views:
+            stats[view] = {"calendars": len(result[view]), "bytes": sum(map(len, result[view].values())),
+                           "events": sum(len(b) for b in blocks[view].values())
+                           + (len(allen_blocks) * len(docenten) if view == "docent" else 0)}
+        stats["seconds"] = perf_counter() - t0
+    return result
+
+def history_size_report(roster, column_vars, docenten, stats, include_allen=False, allen_inclusion=None,
+                        location_overrides=None, export_state=None, workers=1):
+    """
+    Vergelijk een begrensde run (stats uit generate_all(..., history=...)) met
+    de volledige lesgeschiedenis voor dezelfde docenten; genereert die laatste
+    daarvoor opnieuw, dus alleen bedoeld voor debug. Geeft een dict met de
+    totalen 'bytes'/'full_bytes' en 'description_bytes'/'full_description_bytes'.
+    """
+    full_stats = {}
+    generate_all(roster, column_vars, docenten, include_allen, allen_inclusion, warnings=[], workers=workers,
+                 location_overrides=location_overrides, export_state=export_state, stats=full_stats)
+
+    def total(by_docent, key):
+        return sum(s.get(key, 0) for s in by_docent.values())
+    return {"bytes": total(stats, "bytes"), "full_bytes": total(full_stats, "bytes"),
+            "description_bytes": total(stats, "description_bytes"),
+            "full_description_bytes": total(full_stats, "description_bytes")}
+
+def format_size_report(report):
+    """Eén regel tekst bij history_size_report."""
+    def part(label, now, full):
+        saved = f" (−{(1 - now / full) * 100:.0f}%)" if full else ""
+        return f"{label} {full / 1e6:.2f} MB → {now / 1e6:.2f} MB{saved}"
+    return (part("Beschrijvingen", report["description_bytes"], report["full_description_bytes"]) + "; "
+            + part("agenda's", report["bytes"], report["full_bytes"]))
+
+def write_zip(ics_dict, target, compresslevel=6):
+    """
+    Schrijf {docent: ics-bytes} als <docent>.ics naar een ZIP (pad of bestandsobject).
+    compresslevel: 0 = ongecomprimeerd opslaan, 1-9 = deflate (9 = kleinst).
+    """
+    compression = zipfile.ZIP_STORED if compresslevel == 0 else zipfile.ZIP_DEFLATED
+    with zipfile.ZipFile(target, "w", compression=compression, compresslevel=compresslevel or None) as zipf:
+        for docent, ics_bytes in ics_dict.items():
+            zipf.writestr(f"{docent}.ics", ics_bytes)
+
+def zip_bytes(ics_dict, compresslevel=6):
+    """Als write_zip, maar volledig in het geheugen; geeft de ZIP als bytes terug."""
+    buf = io.BytesIO()
+    write_zip(ics_dict, buf, compresslevel)
+    return buf.getvalue()
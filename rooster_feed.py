@@ -0,0 +1,295 @@
+"""
+Rooster Omzetter – abonneerbare ICS-feeds.
+
+Kleine HTTP-server die per docent een agenda serveert op /feeds/<docent>.ics,
+uit het laatst verwerkte rooster. Agenda-apps abonneren zich één keer op de
+URL; bij een nieuw rooster (het Excel-bestand wordt overschreven) worden alleen
+de geraakte agenda's opnieuw gegenereerd, met stabiele UID's en hogere
+SEQUENCE. Feeds worden vooraf gegenereerd en gecomprimeerd; ETag en
+Last-Modified maken een periodieke poll een goedkope 304.
+
+Voorbeelden:
+    python rooster_feed.py rooster.xlsx
+    python rooster_feed.py rooster.xlsx --port 8080 --allen --interval 60 --status feed_status.json
+    python rooster_feed.py rooster.xlsx --geschiedenis periode --dagen 21 --compact
+"""
+import argparse
+import gzip
+import hashlib
+import os
+import sys
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote, urlsplit
+
+from rooster_cli import add_history_arguments, history_from_args, print_warnings, resolve_columns
+from rooster_engine import (
+    AUTODETECT_SAMPLE_ROWS, COLUMN_ROLES, build_export_state, dump_export_state, generate_all, list_sheets,
+    list_teachers, load_export_state, normalize_roster, read_roster, read_roster_cached,
+)
+from rooster_metrics import RunMetrics
+
+
+class FeedStore:
+    """
+    Voorberekende feeds per docent: body, gzip-body, ETag en Last-Modified.
+    update() bouwt een nieuwe dict en vervangt de oude in één keer, zodat
+    lopende requests nooit een half bijgewerkte set zien.
+    """
+
+    def __init__(self, export_state=None):
+        self._feeds = {}
+        self._lock = threading.Lock()
+        self.export_state = export_state
+        self.loaded_at = None
+
+    def update(self, ics_dict, names, now=None):
+        """
+        Nieuwe feeds uit ics_dict; docenten in names die niet in ics_dict zitten
+        houden hun bestaande feed, de rest verdwijnt. Een ongewijzigde agenda
+        houdt zijn Last-Modified.
+        """
+        now = int(now if now is not None else time.time())
+        with self._lock:
+            old = self._feeds
+            feeds = {name: old[name] for name in names if name in old and name not in ics_dict}
+            for docent, body in ics_dict.items():
+                digest = hashlib.sha256(body).hexdigest()[:32]
+                prev = old.get(docent)
+                if prev is not None and prev["etag"] == f'"{digest}"':
+                    feeds[docent] = prev
+                    continue
+                feeds[docent] = {
+                    "body": body,
+                    "gzip": gzip.compress(body, compresslevel=6, mtime=0),
+                    "etag": f'"{digest}"',
+                    "gzip_etag": f'"{digest}-gz"',  # andere codering = andere representatie
+                    "last_modified": now,
+                }
+            self._feeds = feeds
+            self.loaded_at = now
+
+    def get(self, docent):
+        return self._feeds.get(docent)
+
+    def names(self):
+        return sorted(self._feeds)
+
+
+def accepts_gzip(accept_encoding):
+    """True als Accept-Encoding gzip (of *) toestaat, met q > 0."""
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        if coding.strip().lower() not in ("gzip", "*"):
+            continue
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                return float(q[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def is_not_modified(headers, feed):
+    """Conditional GET (RFC 7232): If-None-Match gaat voor If-Modified-Since."""
+    if_none_match = headers.get("If-None-Match")
+    if if_none_match:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or bool(tags & {feed["etag"], feed["gzip_etag"]})
+    if_modified_since = headers.get("If-Modified-Since")
+    if if_modified_since:
+        try:
+            return parsedate_to_datetime(if_modified_since).timestamp() >= feed["last_modified"]
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+    server_version = "RoosterFeed/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._serve(head=False)
+
+    def do_HEAD(self):
+        self._serve(head=True)
+
+    def _serve(self, head):
+        path = urlsplit(self.path).path
+        if path in ("/feeds", "/feeds/"):
+            names = self.server.store.names()
+            return self._send(200, "".join(f"/feeds/{quote(name)}.ics\n" for name in names).encode("utf-8"),
+                              "text/plain; charset=utf-8", head)
+        if not (path.startswith("/feeds/") and path.endswith(".ics")):
+            return self._send(404, b"Niet gevonden\n", "text/plain; charset=utf-8", head)
+        feed = self.server.store.get(unquote(path[len("/feeds/"):-len(".ics")]).lower())
+        if feed is None:
+            return self._send(404, b"Onbekende docent\n", "text/plain; charset=utf-8", head)
+
+        use_gzip = accepts_gzip(self.headers.get("Accept-Encoding", ""))
+        if is_not_modified(self.headers, feed):
+            self.send_response(304)
+            self._validators(feed, use_gzip)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/calendar; charset=utf-8")
+        if use_gzip:
+            self.send_header("Content-Encoding", "gzip")
+        body = feed["gzip"] if use_gzip else feed["body"]
+        self.send_header("Content-Length", str(len(body)))
+        self._validators(feed, use_gzip)
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def _validators(self, feed, use_gzip):
+        self.send_header("ETag", feed["gzip_etag"] if use_gzip else feed["etag"])
+        self.send_header("Last-Modified", formatdate(feed["last_modified"], usegmt=True))
+        self.send_header("Cache-Control", "no-cache")  # altijd revalideren; dat is een goedkope 304
+        self.send_header("Vary", "Accept-Encoding")
+
+    def _send(self, status, body, content_type, head):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class FeedServer(ThreadingHTTPServer):
+    """Eén thread per verbinding; de feeds komen uit een gedeelde FeedStore."""
+    daemon_threads = True
+
+    def __init__(self, address, store, verbose=False):
+        super().__init__(address, FeedHandler)
+        self.store = store
+        self.verbose = verbose
+
+
+def load_feeds(args, store):
+    """
+    Verwerk het rooster en werk de feeds bij. Na de eerste keer worden alleen
+    docenten met wijzigingen (t.o.v. store.export_state) opnieuw gegenereerd.
+    Geeft (aantal gegenereerd, meldingen) terug; ValueError bij een onbruikbaar rooster.
+    """
+    metrics = RunMetrics(sink=args.metrics, source="feed")
+    try:
+        with metrics.stage("read"):
+            with open(args.excel, "rb") as f:
+                data = f.read()
+            sheet = 0 if args.blad is None else args.blad
+            if args.blad is not None and args.blad not in list_sheets(data):
+                raise ValueError(f"Werkblad '{args.blad}' niet gevonden")
+            column_vars, errors, _ = resolve_columns(read_roster(data, sheet, nrows=AUTODETECT_SAMPLE_ROWS), args.kolom)
+            if errors:
+                raise ValueError("; ".join(errors))
+            df = read_roster_cached(data, sheet, list(dict.fromkeys(column_vars.values())))
+        with metrics.stage("normalize"):
+            roster = normalize_roster(df, column_vars)
+        warnings = list(roster["warnings"])
+        with metrics.stage("export_state"):
+            previous = store.export_state
+            export_state, changes = build_export_state(roster, column_vars, previous)
+
+        teachers = list_teachers(roster)
+        names = set(teachers) | changes["teachers"]  # ook docenten van wie alles is vervallen
+        if previous is None or not store.names() or (args.allen and changes["allen"]):
+            docenten = sorted(names)
+        else:
+            docenten = sorted(changes["teachers"])
+        with metrics.stage("generate", teachers=len(docenten)):
+            ics_dict = generate_all(roster, column_vars, docenten, args.allen, warnings=warnings,
+                                    workers=args.workers, export_state=export_state, history=args.history)
+        store.update(ics_dict, names)
+        store.export_state = export_state
+        if args.status:
+            with open(args.status, "wb") as f:
+                f.write(dump_export_state(export_state))
+        return len(ics_dict), warnings
+    finally:
+        metrics.flush()
+
+
+def watch(args, store, stop):
+    """Herlaad de feeds zodra het Excel-bestand verandert (polling op mtime)."""
+    last = os.stat(args.excel).st_mtime_ns
+    while not stop.wait(args.interval):
+        try:
+            mtime = os.stat(args.excel).st_mtime_ns
+            if mtime == last:
+                continue
+            last = mtime
+            generated, warnings = load_feeds(args, store)
+            print_warnings(warnings, args.debug)
+            print(f"Rooster opnieuw verwerkt: {generated} agenda('s) bijgewerkt.", file=sys.stderr)
+        except Exception as e:  # oude feeds blijven beschikbaar
+            print(f"[FOUT] Rooster opnieuw verwerken mislukt: {e}", file=sys.stderr)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serveer per docent een abonneerbare ICS-feed.")
+    parser.add_argument("excel", help="pad naar het .xlsx-rooster (wordt in de gaten gehouden)")
+    parser.add_argument("--host", default="127.0.0.1", help="adres om op te luisteren (standaard alleen lokaal)")
+    parser.add_argument("--port", type=int, default=8765, help="poort (standaard 8765)")
+    parser.add_argument("--blad", default=None, help="naam van het werkblad (standaard: het eerste blad)")
+    parser.add_argument("--allen", action="store_true", help="evenementen voor 'allen' opnemen")
+    parser.add_argument("--kolom", action="append", default=[], metavar="ROL=KOLOM",
+                        help=f"kolomtoewijzing overschrijven; rollen: {', '.join(COLUMN_ROLES)}")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="aantal parallelle processen bij (her)genereren")
+    parser.add_argument("--interval", type=float, default=30,
+                        help="elke zoveel seconden controleren of het rooster is gewijzigd (0 = niet)")
+    parser.add_argument("--status", metavar="JSON",
+                        help="exportstatus bewaren/hervatten, zodat UID's en SEQUENCE een herstart overleven")
+    add_history_arguments(parser)
+    parser.add_argument("--metrics", metavar="PAD", help="metingen per herlaadbeurt als JSON lines")
+    parser.add_argument("--debug", action="store_true", help="ook debug-meldingen en alle requests tonen")
+    args = parser.parse_args(argv)
+    args.history = history_from_args(args, parser)
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    previous = None
+    if args.status and os.path.exists(args.status):
+        with open(args.status, "rb") as f:
+            previous = load_export_state(f.read())
+    store = FeedStore(previous)
+    try:
+        generated, warnings = load_feeds(args, store)
+    except (OSError, ValueError) as e:
+        print(f"[FOUT] {e}", file=sys.stderr)
+        return 2
+    print_warnings(warnings, args.debug)
+
+    server = FeedServer((args.host, args.port), store, verbose=args.debug)
+    stop = threading.Event()
+    if args.interval > 0:
+        threading.Thread(target=watch, args=(args, store, stop), daemon=True).start()
+    host, port = server.server_address[:2]
+    print(f"{generated} feeds klaar op http://{host}:{port}/feeds/<docent>.ics (overzicht: /feeds/)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""
+Rooster Omzetter – metingen per stap.
+
+Eén RunMetrics per run (een rerun van de app of een CLI-aanroep) verzamelt
+geneste stappen met tijd en tellingen (rijen, events, beschrijvingsgrootte,
+cache-hits, ...). flush() schrijft ze als JSON lines naar een sink: een pad
+(wordt aangevuld) of '-' voor stderr, standaard uit de omgevingsvariabele
+ROOSTER_METRICS. flame_text() geeft een ingesprongen overzicht voor debug.
+"""
+import json
+import os
+import sys
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from time import perf_counter
+
+METRICS_ENV = "ROOSTER_METRICS"
+
+_sink_lock = threading.Lock()
+
+
+class RunMetrics:
+    """Stappen van één run; stage() mag genest worden, het pad volgt de nesting."""
+
+    def __init__(self, sink=None, source="app"):
+        self.sink = os.environ.get(METRICS_ENV) if sink is None else sink
+        self.run_id = uuid.uuid4().hex[:12]
+        self.source = source
+        self.started = datetime.now().isoformat(timespec="seconds")
+        self.records = []
+        self._stack = []
+        self._t0 = perf_counter()
+        self._flushed = 0
+
+    def _path(self, name):
+        return "/".join(self._stack + [name])
+
+    @contextmanager
+    def stage(self, name, **fields):
+        """
+        Meet een stap. De yield geeft het record (dict) terug, zodat de aanroeper
+        tellingen kan toevoegen: `with m.stage("zip") as rec: rec["bytes"] = ...`.
+        """
+        record = {"stage": name, "path": self._path(name), "start": round(perf_counter() - self._t0, 6), **fields}
+        self._stack.append(name)
+        t0 = perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record["error"] = repr(e)
+            raise
+        finally:
+            record["seconds"] = round(perf_counter() - t0, 6)
+            self._stack.pop()
+            self.records.append(record)
+
+    def record(self, name, seconds, children=None, **fields):
+        """
+        Een al gemeten (deel)stap onder de huidige stap, bijv. per docent uit
+        generate_all. children: optioneel {naam: seconden} als deelstappen daarvan.
+        """
+        path = self._path(name)
+        self.records.append({"stage": name, "path": path, "start": None, "seconds": round(seconds, 6), **fields})
+        for child, child_seconds in (children or {}).items():
+            self.records.append({"stage": child, "path": f"{path}/{child}", "start": None,
+                                 "seconds": round(child_seconds, 6)})
+
+    def flush(self):
+        """Schrijf de nog niet geschreven records als JSON lines naar de sink (als die er is)."""
+        new = self.records[self._flushed:]
+        self._flushed = len(self.records)
+        if not self.sink or not new:
+            return
+        lines = "".join(json.dumps({"run": self.run_id, "source": self.source, "ts": self.started, **r},
+                                   ensure_ascii=False, default=str) + "\n" for r in new)
+        with _sink_lock:
+            if self.sink == "-":
+                sys.stderr.write(lines)
+            else:
+                with open(self.sink, "a", encoding="utf-8") as f:
+                    f.write(lines)
+
+    def record_generation(self, stats):
+        """
+        Per docent een deelstap uit generate_all(..., stats=...), met tellingen en
+        de tijd uitgesplitst naar selecteren, geschiedenis, opbouwen en serialiseren.
+        """
+        for docent, s in stats.items():
+            if "seconds" not in s:  # fatale fout voor deze docent
+                continue
+            self.record(docent, s["seconds"], events=s["events"], cancelled=s["cancelled"],
+                        description_bytes=s["description_bytes"], bytes=s["bytes"],
+                        children={"filter": s["filter_seconds"], "history": s["history_seconds"],
+                                  "build": s["build_seconds"] - s["history_seconds"],
+                                  "serialize": s["serialize_seconds"]})
+
+
+def flame_rows(records):
+    """
+    Records als boom in aanroepvolgorde: (record, diepte, eigen seconden).
+    Eigen tijd = tijd van de stap min die van de directe deelstappen.
+    """
+    by_parent = {}
+    for r in sorted(records, key=lambda r: (r["start"] is None, r["start"] or 0.0)):
+        by_parent.setdefault(r["path"].rpartition("/")[0], []).append(r)
+    rows = []
+
+    def walk(parent, depth):
+        for r in by_parent.get(parent, []):
+            nested = sum(c["seconds"] for c in by_parent.get(r["path"], []))
+            rows.append((r, depth, max(0.0, r["seconds"] - nested)))
+            walk(r["path"], depth + 1)
+    walk("", 0)
+    return rows
+
+
+def flame_text(records, width=40, max_children=15):
+    """
+    Tekstueel flame-overzicht: per stap een balk naar rato van de totale tijd.
+    Van stappen met veel deelstappen (bijv. één per docent) worden alleen de
+    traagste max_children getoond.
+    """
+    rows = flame_rows(records)
+    total = sum(r["seconds"] for r, depth, _ in rows if depth == 0) or 1.0
+    siblings = {}
+    for r, _, _ in rows:
+        siblings.setdefault(r["path"].rpartition("/")[0], []).append(r["seconds"])
+    cutoff = {parent: sorted(same, reverse=True)[max_children - 1]
+              for parent, same in siblings.items() if len(same) > max_children}
+    lines, hidden = [], set()
+    for r, depth, own in rows:
+        parent = r["path"].rpartition("/")[0]
+        if parent in hidden or r["seconds"] < cutoff.get(parent, 0.0):
+            hidden.add(r["path"])
+            continue
+        bar = "█" * max(1, round(width * r["seconds"] / total)) if r["seconds"] else ""
+        info = " ".join(f"{k}={v}" for k, v in r.items()
+                        if k not in ("stage", "path", "start", "seconds") and v is not None)
+        label = "  " * depth + r["stage"]
+        lines.append(f"{label:<32} {r['seconds']:8.3f}s (eigen {own:.3f}s) {bar} {info}".rstrip())
+    return "\n".join(lines)
@@ -0,0 +1,120 @@
+"""
+Rooster Omzetter – synthetische roosters.
+
+Maakt realistische nep-roosters (series van wekelijkse lessen, meerdere docenten
+per cel, 'allen'-regels, lege zalen) in het Excel-formaat dat de app verwacht.
+Bedoeld voor benchmarks (rooster_bench.py) en om de app te proberen zonder echt
+rooster.
+
+Voorbeeld:
+    python rooster_synth.py 5000 --out voorbeeld.xlsx
+"""
+import argparse
+import io
+import random
+import sys
+from datetime import date, timedelta
+
+import pandas as pd
+
+from rooster_engine import COLUMN_ROLES
+
+FIRST_NAMES = ["Piet", "Klaas", "Anna", "Jan", "Kees", "Joost", "Marie", "Els", "Sanne", "Bram",
+               "Fleur", "Daan", "Noor", "Thijs", "Lotte", "Ruben", "Eva", "Sem", "Iris", "Lars"]
+SUBJECTS = ["Anamnesetraining", "Practicum ECG", "Werkgroep Daders & Slachtoffers", "ABCDE", "Intervisie",
+            "Inleiding Criminologie", "Gastcollege", "Vaardigheidsonderwijs", "Responsiecollege", "Casusbespreking",
+            "Farmacologie", "Reanimatietraining", "Statistiek", "Onderzoeksmethoden", "Ethiek"]
+PROGRAMMES = ["CRIM", "MED", "BMW", "PSY", "REC", "GZW"]
+SLOTS = [(8, 30), (10, 15), (13, 0), (15, 0), (9, 0), (11, 0), (14, 0)]
+ROMAN = ["I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X"]
+SEPARATORS = [", ", "/", "; ", " "]
+
+
+def _teacher_names(count):
+    names = list(FIRST_NAMES[:count])
+    for i in range(len(names), count):
+        names.append(f"{FIRST_NAMES[i % len(FIRST_NAMES)]}{i // len(FIRST_NAMES)}")
+    return names
+
+
+def make_roster(rows=1000, teachers=None, groups=None, series_length=8, multi_teacher=0.25, allen=0.05,
+                missing_room=0.05, start=date(2025, 9, 1), seed=0):
+    """
+    Synthetisch rooster als DataFrame met de kolommen uit COLUMN_ROLES (plus 'Opmerking').
+
+    rows:          aantal regels
+    teachers:      aantal docenten (standaard meegroeiend: rows // 200, minimaal 8)
+    groups:        aantal studentgroepen (standaard rows // 100, minimaal 4)
+    series_length: lessen per serie ("Anamnesetraining 1" .. "Anamnesetraining N"), wekelijks
+    multi_teacher: fractie series met 2–3 docenten in één cel (bijv. "Piet, Klaas/Anna")
+    allen:         fractie regels voor 'allen'
+    missing_room:  fractie regels zonder zaal
+    Zelfde argumenten + seed geven hetzelfde rooster.
+    """
+    rnd = random.Random(seed)
+    teachers = _teacher_names(teachers or max(8, rows // 200))
+    groups = [f"{PROGRAMMES[i % len(PROGRAMMES)]}-{i // len(PROGRAMMES) + 1}{'ABCD'[i % 4]}"
+              for i in range(groups or max(4, rows // 100))]
+    out = []
+    while len(out) < rows:
+        subject = rnd.choice(SUBJECTS)
+        group = rnd.choice(groups)
+        hour, minute = rnd.choice(SLOTS)
+        duration = rnd.choice([60, 90, 105, 120])
+        first = start + timedelta(days=rnd.randint(0, 34))
+        roman = rnd.random() < 0.2
+        is_allen = rnd.random() < allen
+        if is_allen:
+            cell = "allen"
+        elif rnd.random() < multi_teacher:
+            names = rnd.sample(teachers, rnd.choice([2, 2, 3]))
+            cell = names[0] + "".join(rnd.choice(SEPARATORS) + n for n in names[1:])
+        else:
+            cell = rnd.choice(teachers)
+        room = f"{rnd.choice('ABCDE')}.{rnd.randint(0, 4)}.{rnd.randint(1, 30):02d}"
+        length = 1 if is_allen else max(1, min(series_length, rows - len(out)))
+        for n in range(length):
+            end = hour * 60 + minute + duration
+            number = ROMAN[n % len(ROMAN)] if roman else str(n + 1)
+            out.append({
+                "Datum": (first + timedelta(weeks=n)).strftime("%d-%m-%Y"),
+                "Van": f"{hour:02d}:{minute:02d}",
+                "Tot": f"{end // 60:02d}:{end % 60:02d}",
+                "Student groep": group,
+                "Zaal": None if rnd.random() < missing_room else room,
+                "Beschrijving NL": subject if length == 1 else f"{subject} {number}",
+                "Docenten": cell,
+                "Opmerking": "",
+            })
+            if len(out) >= rows:
+                break
+    df = pd.DataFrame(out[:rows], columns=COLUMN_ROLES + ["Opmerking"])
+    # Willekeurige volgorde, zoals een export uit een roosterpakket
+    return df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+def roster_xlsx_bytes(df):
+    """Het rooster als .xlsx-bytes (zoals een upload)."""
+    buf = io.BytesIO()
+    df.to_excel(buf, index=False)
+    return buf.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maak een synthetisch Excel-rooster.")
+    parser.add_argument("rows", type=int, help="aantal regels")
+    parser.add_argument("--out", required=True, help="pad voor het .xlsx-bestand")
+    parser.add_argument("--docenten", type=int, default=None, help="aantal docenten")
+    parser.add_argument("--groepen", type=int, default=None, help="aantal studentgroepen")
+    parser.add_argument("--serie", type=int, default=8, help="lessen per serie (standaard 8)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    df = make_roster(args.rows, args.docenten, args.groepen, args.serie, seed=args.seed)
+    with open(args.out, "wb") as f:
+        f.write(roster_xlsx_bytes(df))
+    print(f"{len(df)} regels geschreven naar {args.out}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
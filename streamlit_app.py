@@ -1,22 +1,19 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime, time as dt_time
-from icalendar import Calendar, Event
-import zipfile
-import re
+import hashlib
+import math
+import os
 import traceback
 from time import perf_counter
 
-# NL naam-mapping
-NL_WEEKDAYS = {
-    "Monday":"maandag","Tuesday":"dinsdag","Wednesday":"woensdag",
-    "Thursday":"donderdag","Friday":"vrijdag","Saturday":"zaterdag","Sunday":"zondag"
-}
-NL_MONTHS = {
-    "January":"januari","February":"februari","March":"maart","April":"april",
-    "May":"mei","June":"juni","July":"juli","August":"augustus",
-    "September":"september","October":"oktober","November":"november","December":"december"
-}
+from artifact_cache import ArtifactCache, content_digest
+from rooster_metrics import RunMetrics, flame_text
+from rooster_engine import (
+    AUTODETECT_SAMPLE_ROWS, LOW_CONFIDENCE, build_export_state, calendar_filename, dump_export_state, excel_engine,
+    format_memory, format_size_report, generate_all, generate_views, history_options, history_size_report, list_sheets,
+    list_teachers, load_export_state, normalize_roster, profile_columns, read_roster, read_roster_cached, roster_memory,
+    zip_bytes,
+)
 
 # ===============================================================
 # PAGINA-INSTELLINGEN
@@ -44,6 +41,9 @@ st.markdown("""
 st.sidebar.markdown("<div class='sidebar'><h3>Instellingen</h3></div>", unsafe_allow_html=True)
 debug_mode = st.sidebar.checkbox("Debug-modus (aanbevolen bij problemen)", value=False)
 
+# Metingen van deze rerun; JSON lines naar ROOSTER_METRICS (pad of '-') als die gezet is
+metrics = RunMetrics()
+
 def dbg(title, value=None):
     if debug_mode:
         with st.expander(f"🔎 {title}", expanded=False):
@@ -55,13 +55,17 @@ def dbg(title, value=None):
             else:
                 st.write("OK")
 
-def safe_section(step_title):
+def safe_section(step_title, stage):
+    """Stap met foutmelding in de UI; gemeten als `stage` in metrics (het record komt terug uit with)."""
     class _Section:
         def __enter__(self_inner):
             self_inner.t0 = perf_counter()
+            self_inner.measure = metrics.stage(stage)
             if debug_mode: st.info(f"Start: {step_title}")
+            return self_inner.measure.__enter__()
         def __exit__(self_inner, exc_type, exc, tb):
             dt = perf_counter() - self_inner.t0
+            self_inner.measure.__exit__(exc_type, exc, tb)
             if exc:
                 st.error(f"❌ Fout in '{step_title}': {exc}")
                 if debug_mode and tb: st.exception(exc)
@@ -69,280 +73,170 @@ def safe_section(step_title):
                 if debug_mode: st.success(f"Klaar: {step_title} ({dt:.2f}s)")
     return _Section()
 
+def show_warnings(warnings):
+    """Toon meldingen uit rooster_engine (debug-meldingen alleen in debug-modus)."""
+    for w in warnings:
+        if w["level"] == "debug":
+            dbg(w["message"], w["detail"])
+            continue
+        (st.error if w["level"] == "error" else st.warning)(w["message"])
+        if debug_mode and w["detail"]: st.code(w["detail"])
+
 # ===============================================================
-# HULPFUNCTIES DATA
+# CACHE
 # ===============================================================
-def to_dt(date_val, dayfirst=True):
-    return pd.to_datetime(date_val, dayfirst=True, errors="coerce").normalize()
-
-def dutch_date_str(ts):
-    if isinstance(ts, (pd.Timestamp, datetime)): d = ts
-    else: d = to_dt(ts)
-    if pd.isna(d): return "onbekende datum"
-    s = d.strftime("%A %d %B %Y")
-    for en, nl in NL_WEEKDAYS.items(): s = s.replace(en, nl)
-    for en, nl in NL_MONTHS.items(): s = s.replace(en, nl)
-    return s
-
-def parse_time(time_str):
-    if isinstance(time_str, str):
-        try: return datetime.strptime(time_str.strip(), "%H:%M").time()
-        except Exception:
-            dbg("⚠️ Onverwacht tijdformaat aangetroffen", time_str)
-            return dt_time(0, 0)
-    elif isinstance(time_str, dt_time): return time_str
-    else:
-        dbg("⚠️ Tijdveld is geen tekst of tijdobject", str(type(time_str)))
-        return dt_time(0, 0)
-
-def split_docenten(docent_cell):
-    if isinstance(docent_cell, str):
-        parts = re.split(r'[\s,/;]+', docent_cell.strip())
-        return [p for p in parts if p]
-    return []
-
-def is_allen_only(row, col):
-    teachers = [t.lower() for t in split_docenten(row[col])]
-    return "allen" in teachers and len(teachers) == 1
-
-def sort_df_chronologically(df, column_vars):
-    out = df.copy()
-    out["orig_idx"] = df.index
-    out["_dt"] = pd.to_datetime(out[column_vars["Datum"]], dayfirst=True, errors="coerce")
-    out["_tstart"] = out[column_vars["Van"]].apply(parse_time)
-    out["_tstart"] = out["_tstart"].apply(
-        lambda t: pd.Timestamp.combine(pd.Timestamp("1900-01-01"), t) if pd.notna(t) else pd.NaT
-    )
-    out = out.sort_values(["_dt", "_tstart", column_vars["Beschrijving NL"]], kind="mergesort").reset_index(drop=True)
-    return out
-
-# ---- Serie-sleutel uit beschrijving (heuristisch) ----
-_SERIES_RX = re.compile(r'\b([ivxlcdm]+|\d+)\b$', re.IGNORECASE)
-
-def series_key_from_desc(desc: str) -> str:
+# Alles is gesleuteld op een digest van de bestandsinhoud; het DataFrame zelf
+# (parameters met _) wordt daardoor niet bij elke aanroep opnieuw gehasht.
+@st.cache_data(show_spinner=False)
+def cached_list_sheets(file_digest, _data): return list_sheets(_data)
+
+@st.cache_data(show_spinner=False)
+def load_excel_sample(source_key, _data):
+    """Eerste rijen van het blad: genoeg voor kolomkeuze en -herkenning."""
+    return read_roster(_data, source_key[1], nrows=AUTODETECT_SAMPLE_ROWS)
+
+@st.cache_resource(show_spinner=False, max_entries=int(os.environ.get("ROOSTER_CACHE_ROSTERS", "8")))
+def cached_roster(source_key, column_items, _data):
     """
-    Maak een serie-sleutel op basis van de beschrijving:
-    - lowercase
-    - verwijder eventueel trailing nummer of Romeins cijfer (I, II, III, IV, V, ...)
-    - trim spaties
-    Voorbeeld: "Anamnesetraining 5" -> "anamnesetraining"
+    Het genormaliseerde rooster, één keer per bestand + kolomkeuze en gedeeld
+    door alle sessies: cache_resource geeft geen kopie per sessie of rerun (het
+    rooster wordt nergens aangepast). Het ingelezen blad zelf wordt niet bewaard.
     """
-    if not isinstance(desc, str):
-        return ""
-    s = desc.strip().lower()
-    # strip één trailing nummer/romeins cijfer
-    s = _SERIES_RX.sub("", s).strip()
-    # normaliseer dubbele spaties
-    s = re.sub(r'\s+', ' ', s)
-    return s
-
-def get_future_series_teachers(row, df, column_vars):
+    column_vars = dict(column_items)
+    t0 = perf_counter()
+    df = read_roster_cached(_data, source_key[1], list(dict.fromkeys(column_vars.values())))
+    metrics.record("read", perf_counter() - t0, rows=df.shape[0])  # alleen bij een cache-miss
+    roster = normalize_roster(df, column_vars)
+    for name, seconds in roster["timings"].items():
+        metrics.record(name, seconds)
+    return roster
+
+@st.cache_data(show_spinner=False)
+def cached_profile(source_key, _preview_df): return profile_columns(_preview_df)
+
+@st.cache_data(show_spinner=False)
+def cached_teachers(source_key, column_items, _roster): return list_teachers(_roster)
+
+@st.cache_data(show_spinner=False)
+def cached_allen_table(source_key, column_items, _roster):
+    """Compacte tabel van de 'allen'-events (orig_idx, dag, label, standaardlocatie) voor de selector."""
+    column_vars = dict(column_items)
+    rows = _roster["rows"]
+    allen = rows.loc[rows["_allen_only"]].sort_values("orig_idx")
+    zaal = allen[column_vars["Zaal"]].astype(object)  # kan categorisch zijn
+    return pd.DataFrame({
+        "orig_idx": allen["orig_idx"].tolist(),
+        "day": allen["_dt"].dt.normalize().to_numpy(),
+        "label": (allen[column_vars["Datum"]].astype(str) + " " + allen[column_vars["Van"]].astype(str) + "-"
+                  + allen[column_vars["Tot"]].astype(str) + " - " + allen[column_vars["Beschrijving NL"]].astype(str)
+                  ).to_numpy(),
+        "location": zaal.where(zaal.notna() & (zaal != ""), "Onbekend").astype(str).to_numpy(),
+    })
+
+@st.cache_resource(show_spinner=False, max_entries=int(os.environ.get("ROOSTER_CACHE_ROSTERS", "8")))
+def cached_export_state(source_key, column_items, previous_digest, _roster, _previous_bytes):
     """
-    Voor dezelfde SERIE (op basis van serie-sleutel) + zelfde groep:
-    toon toekomstige lessen (na dit event), met datum, beschrijving en docent(en).
+    (exportstatus, wijzigingen, statusbestand als JSON-bytes), gedeeld door alle
+    sessies zoals cached_roster: niets past de status aan, en zo wordt hij niet
+    bij elke rerun opnieuw uitgepakt of voor de download opnieuw geserialiseerd.
     """
-    cur_dt = row.get("_dt")
-    if pd.isna(cur_dt):
-        cur_dt = pd.to_datetime(row[column_vars["Datum"]], dayfirst=True, errors="coerce")
-
-    # serie-sleutel huidige rij
-    cur_key = series_key_from_desc(row[column_vars["Beschrijving NL"]])
-
-    # serie-sleutel voor alle rijen
-    all_keys = df[column_vars["Beschrijving NL"]].astype(str).apply(series_key_from_desc)
-
-    same_series = all_keys == cur_key
-    same_grp    = df[column_vars["Student groep"]] == row[column_vars["Student groep"]]
-    future      = df["_dt"] > cur_dt
-
-    serie_rows = df[same_series & same_grp & future]
-
-    lines, seen = [], set()
-    for _, srow in serie_rows.iterrows():
-        dt = srow.get("_dt")
-        if pd.isna(dt):
-            dt = pd.to_datetime(srow[column_vars["Datum"]], dayfirst=True, errors="coerce")
-        date_txt = dutch_date_str(dt)
-        besch    = str(srow[column_vars["Beschrijving NL"]]).strip()
-        teacher_list = split_docenten(srow[column_vars["Docenten"]])
-        teacher_str  = ", ".join(teacher_list) if teacher_list else "onbekend"
-        zaal         = srow[column_vars["Zaal"]]
-        line = f"{date_txt} – {besch} – {teacher_str} (lokaal: {zaal})"
-        if line not in seen:
-            seen.add(line)
-            lines.append(line)
-    return lines
-
-def autodetect_date_column(df):
-    for col in df.columns:
-        for val in df[col].dropna().astype(str).head(10):
-            try:
-                pd.to_datetime(val, dayfirst=True)
-                return col
-            except: continue
-    return None
-
-def autodetect_time_columns(df):
-    time_candidates = []
-    for col in df.columns:
-        vals = df[col].dropna().astype(str).head(10)
-        count = sum(1 for val in vals if re.match(r'^\d{1,2}:\d{2}$', val.strip()))
-        if count >= 3: time_candidates.append(col)
-    if len(time_candidates) >= 2: return time_candidates[0], time_candidates[1]
-    elif len(time_candidates) == 1: return time_candidates[0], None
-    else: return None, None
-
-def autodetect_studentgroep(df):
-    for col in df.columns:
-        if "groep" in col.lower(): return col
-    return None
-
-def autodetect_zaal(df):
-    for col in df.columns:
-        if "zaal" in col.lower(): return col
-    return None
-
-def autodetect_beschrijving(df):
-    for col in df.columns:
-        if "beschrijving" in col.lower(): return col
-    return None
-
-def autodetect_docenten(df):
-    for col in df.columns:
-        if "docent" in col.lower(): return col
-    return None
-
-def get_lesson_history(selected_columns, docent, group, current_pos, df_sorted, history_type, current_desc=None):
+    previous = load_export_state(_previous_bytes) if _previous_bytes else None
+    export_state, changes = build_export_state(_roster, dict(column_items), previous)
+    return export_state, changes, dump_export_state(export_state)
+
+@st.cache_resource(show_spinner=False)
+def get_artifact_cache():
+    """Gedeelde agenda-cache; grootte via ROOSTER_CACHE_MB (standaard 256 MB)."""
+    return ArtifactCache(int(os.environ.get("ROOSTER_CACHE_MB", "256")) * 1024 * 1024)
+
+def _artifact_size(ics_bytes, warnings):
+    return len(ics_bytes or b"") + sum(len(w["message"]) + len(w["detail"] or "") for w in warnings)
+
+def session_zip_bytes(ics_dict, compresslevel, slot="zip_cache"):
     """
-    Vorige/toekomstige lessen voor dezelfde docent + groep, optioneel
-    beperkt tot dezelfde beschrijving (current_desc).
+    ZIP van alle agenda's, in het geheugen en per sessie bewaard (per slot in
+    session_state). Wordt alleen opnieuw gebouwd als de set agenda's (of het
+    compressieniveau) verandert.
     """
-    lessons = []
-    docent_l = (docent or "").strip().lower()
-    rows = df_sorted.iloc[:current_pos] if history_type=="previous" else df_sorted.iloc[current_pos+1:]
-    for _, row in rows.iterrows():
-        teachers_in_row = [t.strip().lower() for t in split_docenten(row.get(selected_columns["Docenten"], ""))]
-        same_teacher = docent_l in teachers_in_row
-        same_group   = row.get(selected_columns["Student groep"]) == group
-        same_desc    = (current_desc is None) or (row.get(selected_columns["Beschrijving NL"]) == current_desc)
-        if same_teacher and same_group and same_desc:
-            dt = row.get("_dt")
-            besch = row.get(selected_columns["Beschrijving NL"], "")
-            lessons.append(f"{besch} , {dutch_date_str(dt)}")
-    seen, uniq = set(), []
-    for x in lessons:
-        if x not in seen:
-            seen.add(x); uniq.append(x)
-    return uniq
-
-# ===============================================================
-# ICS-GENERATIE
-# ===============================================================
-def generate_ics_bytes(docent, df_filtered, df_full, column_vars, include_allen_var):
-    try:
-        docent_lower = docent.lower()
-        base_sorted = sort_df_chronologically(df_full, column_vars)
-
-        teacher_df = base_sorted[base_sorted.apply(
-            lambda row: docent_lower in [t.lower() for t in split_docenten(row[column_vars["Docenten"]])]
-                        and not is_allen_only(row, column_vars["Docenten"]),
-            axis=1
-        )].reset_index(drop=True)
-
-        cal = Calendar()
-        cal.add("version", "2.0")
-        cal.add("prodid", "-//Rooster Omzetter//NONSGML v1.0//NL")
-
-        # Docent-specifiek
-        for pos, row in teacher_df.iterrows():
-            try:
-                datum_parsed = to_dt(row[column_vars["Datum"]]).date()
-                van_tijd, tot_tijd = parse_time(row[column_vars["Van"]]), parse_time(row[column_vars["Tot"]])
-                dtstart, dtend = datetime.combine(datum_parsed, van_tijd), datetime.combine(datum_parsed, tot_tijd)
-
-                event = Event()
-                teacher_str = ", ".join(split_docenten(row[column_vars["Docenten"]]))
-                event.add("summary", f"{row[column_vars['Beschrijving NL']]} - {teacher_str}")
-                event.add("dtstart", dtstart); event.add("dtend", dtend)
-
-                description = f"{row[column_vars['Beschrijving NL']]} - Groep: {row[column_vars['Student groep']]}"
-                description += f"\nLokaal: {row[column_vars['Zaal']]}"
-
-                current_desc = row[column_vars["Beschrijving NL"]]
-                prev_lessons = get_lesson_history(column_vars, docent, row[column_vars["Student groep"]],
-                                                  pos, teacher_df, "previous", current_desc)
-                fut_lessons  = get_lesson_history(column_vars, docent, row[column_vars["Student groep"]],
-                                                  pos, teacher_df, "future", current_desc)
-                if prev_lessons: description += "\n\nVorige lessen:\n" + "\n".join(prev_lessons)
-                if fut_lessons:  description += "\n\nToekomstige lessen:\n" + "\n".join(fut_lessons)
-
-                serie_future = get_future_series_teachers(row, base_sorted, column_vars)
-                if serie_future:
-                    description += "\n\nAndere lessen in deze serie (komend, met docent):\n" + "\n".join(serie_future)
-
-                event.add("description", description); cal.add_component(event)
-            except Exception as inner_e:
-                st.warning(f"Regel overgeslagen (pos={pos}) door fout: {inner_e}")
-                if debug_mode: st.code(traceback.format_exc())
-
-        # 'Allen'-regels (optioneel)
-        if include_allen_var:
-            allen_df = base_sorted[base_sorted.apply(
-                lambda row: is_allen_only(row, column_vars["Docenten"]), axis=1
-            )].reset_index(drop=True)
-
-            for pos, row in allen_df.iterrows():
-                try:
-                    orig_idx = row.get("orig_idx", None)
-                    if "allen_inclusion" in st.session_state and orig_idx is not None:
-                        if not st.session_state.allen_inclusion.get(orig_idx, True):
-                            continue
-
-                    datum_parsed = to_dt(row[column_vars["Datum"]]).date()
-                    van_tijd, tot_tijd = parse_time(row[column_vars["Van"]]), parse_time(row[column_vars["Tot"]])
-                    dtstart, dtend = datetime.combine(datum_parsed, van_tijd), datetime.combine(datum_parsed, tot_tijd)
-
-                    event = Event()
-                    teacher_str = ", ".join(split_docenten(row[column_vars["Docenten"]]))
-                    event.add("summary", f"{row[column_vars['Beschrijving NL']]} - {teacher_str}")
-                    event.add("dtstart", dtstart); event.add("dtend", dtend)
-
-                    description = f"{row[column_vars['Beschrijving NL']]} - Groep: {row[column_vars['Student groep']]}"
-                    description += f"\nLokaal: {row[column_vars['Zaal']]}"
-
-                    current_desc = row[column_vars["Beschrijving NL"]]
-                    prev_lessons = get_lesson_history(column_vars, "allen", row[column_vars["Student groep"]],
-                                                      pos, allen_df, "previous", current_desc)
-                    fut_lessons  = get_lesson_history(column_vars, "allen", row[column_vars["Student groep"]],
-                                                      pos, allen_df, "future", current_desc)
-                    if prev_lessons: description += "\n\nVorige lessen:\n" + "\n".join(prev_lessons)
-                    if fut_lessons:  description += "\n\nToekomstige lessen:\n" + "\n".join(fut_lessons)
-
-                    serie_future = get_future_series_teachers(row, base_sorted, column_vars)
-                    if serie_future:
-                        description += "\n\nAndere lessen in deze serie (komend, met docent):\n" + "\n".join(serie_future)
-
-                    event.add("description", description); cal.add_component(event)
-                except Exception as inner_e:
-                    st.warning(f"'Allen'-regel overgeslagen (pos={pos}) door fout: {inner_e}")
-                    if debug_mode: st.code(traceback.format_exc())
-
-        return cal.to_ical()
-
-    except Exception as e:
-        st.error(f"Er is een fout opgetreden voor docent {docent}:\n{e}")
-        if debug_mode: st.code(traceback.format_exc())
-        return None
+    digest = hashlib.sha256(str(compresslevel).encode())
+    for docent, ics_bytes in ics_dict.items():
+        digest.update(docent.encode("utf-8") + b"\0")
+        digest.update(hashlib.sha256(ics_bytes).digest())
+    key = digest.hexdigest()
+    cached = st.session_state.get(slot)
+    with metrics.stage("zip", files=len(ics_dict), cache_hit=cached is not None and cached[0] == key) as rec:
+        if not rec["cache_hit"]:
+            st.session_state[slot] = (key, zip_bytes(ics_dict, compresslevel))
+        rec["bytes"] = len(st.session_state[slot][1])
+    return st.session_state[slot][1]
 
 # ===============================================================
-# CACHE
+# 'ALLEN'-SELECTIE
 # ===============================================================
-@st.cache_data(show_spinner=False)
-def load_excel(file): return pd.read_excel(file)
-
-@st.cache_data(show_spinner=False)
-def cached_generate_ics_bytes(docent, df, column_vars, include_allen_var):
-    return generate_ics_bytes(docent, df, df, column_vars, include_allen_var)
+# De selectie staat in st.session_state.allen_state (per rooster + kolomkeuze);
+# widgets zijn er alleen voor de getoonde pagina. De selector is een fragment:
+# zoeken, bladeren en aan/uit zetten herladen alleen dit stuk van de pagina.
+ALLEN_PAGE_SIZE = 20
+
+def get_allen_state(state_key):
+    state = st.session_state.get("allen_state")
+    if state is None or state["key"] != state_key:
+        state = st.session_state.allen_state = {"key": state_key, "excluded": set(), "locations": {}}
+    return state
+
+def _set_allen(state, indexes, keep):
+    for idx in indexes:
+        (state["excluded"].discard if keep else state["excluded"].add)(idx)
+        if f"allen_inclusion_{idx}" in st.session_state:
+            st.session_state[f"allen_inclusion_{idx}"] = keep
+
+def _toggle_allen(state, idx):
+    _set_allen(state, [idx], st.session_state[f"allen_inclusion_{idx}"])
+
+def _set_allen_location(state, idx, default):
+    location = st.session_state[f"allen_loc_{idx}"]
+    if location != default:
+        state["locations"][idx] = location
+    else:
+        state["locations"].pop(idx, None)
+
+@st.fragment
+def allen_selector(table, state):
+    st.write(f"Gevonden {len(table)} evenementen voor 'allen'.")
+    view = table
+    search = st.text_input("Zoeken", key="allen_search")
+    if search:
+        view = view[view["label"].str.contains(search, case=False, regex=False)]
+    days = table["day"].dropna()
+    if not days.empty:
+        first, last = days.min().date(), days.max().date()
+        period = st.date_input("Periode", value=(first, last), min_value=first, max_value=last, key="allen_period")
+        if len(period) == 2:
+            view = view[(view["day"] >= pd.Timestamp(period[0])) & (view["day"] <= pd.Timestamp(period[1]))]
+
+    visible = view["orig_idx"].tolist()
+    col_on, col_off = st.columns(2)
+    col_on.button("Gefilterde aan", on_click=_set_allen, args=(state, visible, True), key="allen_all_on")
+    col_off.button("Gefilterde uit", on_click=_set_allen, args=(state, visible, False), key="allen_all_off")
+
+    pages = max(1, math.ceil(len(view) / ALLEN_PAGE_SIZE))
+    page = 1
+    if pages > 1:
+        if st.session_state.get("allen_page", 1) > pages:
+            st.session_state.allen_page = pages
+        page = st.number_input(f"Pagina (van {pages})", min_value=1, max_value=pages, value=1, key="allen_page")
+    for row in view.iloc[(page - 1) * ALLEN_PAGE_SIZE:page * ALLEN_PAGE_SIZE].itertuples(index=False):
+        inclusion_key, location_key = f"allen_inclusion_{row.orig_idx}", f"allen_loc_{row.orig_idx}"
+        st.session_state.setdefault(inclusion_key, row.orig_idx not in state["excluded"])
+        st.session_state.setdefault(location_key, state["locations"].get(row.orig_idx, row.location))
+        st.checkbox(row.label, key=inclusion_key, on_change=_toggle_allen, args=(state, row.orig_idx))
+        st.text_input("Locatie", key=location_key, on_change=_set_allen_location,
+                      args=(state, row.orig_idx, row.location))
+
+    st.caption(f"{len(view)} getoond na filter; {len(state['excluded'])} uitgesloten, "
+               f"{len(state['locations'])} locatie(s) aangepast.")
+    if st.button("Toepassen op downloads", key="allen_apply"):
+        st.rerun()
 
 # ===============================================================
 # UI
@@ -355,24 +249,34 @@ Deze tool zet een Excel-rooster om naar ICS-agendagegevens.
 st.markdown("---")
 
 # Upload
-with safe_section("Excel uploaden en inlezen"):
+with safe_section("Excel uploaden en inlezen", "upload") as upload_metrics:
     with st.expander("Stap 1: Upload je Excel-bestand", expanded=True):
         uploaded_file = st.file_uploader("Kies je Excel-bestand", type="xlsx")
-        df = None
+        preview_df, source_key = None, None
         if uploaded_file:
-            df = load_excel(uploaded_file)
+            file_bytes = uploaded_file.getvalue()
+            file_digest = content_digest(file_bytes)
+            upload_metrics["bytes"] = len(file_bytes)
+            sheets = cached_list_sheets(file_digest, file_bytes)
+            sheet = st.selectbox("Werkblad", sheets) if len(sheets) > 1 else sheets[0]
+            source_key = (file_digest, sheet)
+            preview_df = load_excel_sample(source_key, file_bytes)
             st.success("Excel-bestand succesvol geladen!")
-            dbg("Eerste 5 rijen", df.head()); dbg("Kolommen", list(df.columns))
+            dbg("Excel-backend", excel_engine())
+            dbg("Eerste 5 rijen", preview_df.head()); dbg("Kolommen", list(preview_df.columns))
 
 # Kolommen
 column_vars, columns_set = {}, False
-if df is not None:
-    with safe_section("Kolommen"):
-        detected_datum = autodetect_date_column(df)
-        detected_van, detected_tot = autodetect_time_columns(df)
-        detected_studentgroep, detected_zaal = autodetect_studentgroep(df), autodetect_zaal(df)
-        detected_beschrijving, detected_docenten = autodetect_beschrijving(df), autodetect_docenten(df)
-        available_columns = df.columns.tolist()
+if preview_df is not None:
+    with safe_section("Kolommen", "autodetect"):
+        profile = cached_profile(source_key, preview_df)
+        detected = profile["roles"]
+        dbg("Kolomprofiel (steekproef)", pd.DataFrame(profile["columns"]).T)
+        dbg("Zekerheid per rol", profile["confidence"])
+        detected_datum, detected_van, detected_tot = detected["Datum"], detected["Van"], detected["Tot"]
+        detected_studentgroep, detected_zaal = detected["Student groep"], detected["Zaal"]
+        detected_beschrijving, detected_docenten = detected["Beschrijving NL"], detected["Docenten"]
+        available_columns = preview_df.columns.tolist()
         with st.container():
             st.markdown('<div class="box">', unsafe_allow_html=True)
             column_vars["Datum"] = st.selectbox("Kolom Datum", available_columns,
@@ -392,51 +296,133 @@ if df is not None:
             st.markdown('</div>', unsafe_allow_html=True)
         if all(col in available_columns for col in column_vars.values()):
             st.success("Kolommen toegewezen!"); columns_set = True
+            uncertain = [f"{role} ({profile['confidence'][role]:.0%})" for role in column_vars
+                         if column_vars[role] == detected[role] and profile["confidence"][role] < LOW_CONFIDENCE]
+            if uncertain:
+                st.warning("Onzeker herkend, controleer deze kolommen: " + ", ".join(uncertain))
         else:
             st.error("Niet alle kolommen zijn correct toegewezen. Controleer de kolominstellingen.")
 
+# Inlezen en normaliseren (één keer per rooster + kolomkeuze, gedeeld door alle sessies)
+roster = None
+if preview_df is not None and columns_set:
+    with safe_section("Rooster inlezen en normaliseren", "normalize") as normalize_metrics:
+        roster = cached_roster(source_key, tuple(column_vars.items()), file_bytes)
+        normalize_metrics.update(rows=roster["rows"].shape[0], pairs=roster["teachers"].shape[0])
+        show_warnings(roster["warnings"])
+        dbg("Genormaliseerde rijen (max 5)", roster["rows"].head())
+        dbg("(rij, docent)-paren", roster["teachers"].shape[0])
+        dbg("Geheugengebruik rooster", format_memory(roster_memory(roster)))
+
 # Extra instellingen
 include_allen_var = st.sidebar.checkbox("Evenementen voor 'allen' opnemen", value=False, key="include_allen")
+zip_level = st.sidebar.slider("ZIP-compressie (0 = niet comprimeren, 9 = kleinst)", min_value=0, max_value=9,
+                              value=6, key="zip_level")
+workers = st.sidebar.number_input("Parallelle processen bij meerdere docenten", min_value=1, max_value=32,
+                                  value=min(4, os.cpu_count() or 1), step=1, key="workers")
+HISTORY_LABELS = {"full": "Volledig", "window": "Laatste/volgende lessen", "horizon": "Binnen een periode",
+                  "off": "Uit"}
+history_mode = st.sidebar.selectbox("Lesgeschiedenis in elke beschrijving", list(HISTORY_LABELS),
+                                    format_func=HISTORY_LABELS.__getitem__, key="history_mode",
+                                    help="Lange series maken de beschrijvingen (en de .ics-bestanden) snel groot.")
+history_count = st.sidebar.number_input("Aantal vorige/volgende lessen", min_value=1, max_value=50, value=3, step=1,
+                                        key="history_count") if history_mode == "window" else 3
+history_days = st.sidebar.number_input("Dagen ervoor/erna", min_value=0, max_value=365, value=28, step=7,
+                                       key="history_days") if history_mode == "horizon" else 28
+history_compact = st.sidebar.checkbox("Compact: serie-overzicht één keer per agenda", value=False,
+                                      key="history_compact", disabled=history_mode == "off")
+history = history_options(history_mode, history_count, history_days, history_compact)
+previous_status_file = st.sidebar.file_uploader("Vorige exportstatus (optioneel, rooster_status.json)", type="json",
+                                                key="previous_status")
+
+# Exportstatus: stabiele UID's, SEQUENCE en annuleringen t.o.v. de vorige export
+export_state, changes, export_state_bytes, previous_digest = None, None, None, None
+if roster is not None:
+    with safe_section("Exportstatus bepalen", "export_state"):
+        previous_bytes = previous_status_file.getvalue() if previous_status_file else None
+        previous_digest = content_digest(previous_bytes) if previous_bytes else None
+        try:
+            export_state, changes, export_state_bytes = cached_export_state(
+                source_key, tuple(column_vars.items()), previous_digest, roster, previous_bytes)
+        except ValueError as e:
+            st.sidebar.error(f"Vorige exportstatus niet bruikbaar: {e}")
+            previous_digest = None
+            export_state, changes, export_state_bytes = cached_export_state(
+                source_key, tuple(column_vars.items()), None, roster, None)
+        if previous_digest:
+            st.sidebar.info(f"Wijzigingen: {len(changes['added'])} nieuw, {len(changes['changed'])} gewijzigd, "
+                            f"{len(changes['removed'])} vervallen.")
+        dbg("Exportstatus (revisie, events)", (export_state["revision"], len(export_state["events"])))
 
 # 'Allen' selectie (op basis van originele df-indexen)
-if include_allen_var and df is not None and columns_set:
-    with safe_section("'Allen'-evenementen voorbereiden"):
-        allen_rows = df[df.apply(lambda row: is_allen_only(row, column_vars["Docenten"]), axis=1)]
+allen_inclusion, location_overrides = {}, {}
+if include_allen_var and roster is not None:
+    with safe_section("'Allen'-evenementen voorbereiden", "allen"):
+        allen_table = cached_allen_table(source_key, tuple(column_vars.items()), roster)
+        allen_state = get_allen_state((source_key, tuple(column_vars.items())))
         with st.sidebar.expander("Evenementen voor 'allen' – selecteer welke je wil opnemen"):
-            st.write(f"Gevonden {allen_rows.shape[0]} evenementen voor 'allen'.")
-            allen_inclusion = {}
-            for idx, row in allen_rows.iterrows():
-                corrected_location = row[column_vars["Zaal"]]
-                if pd.isna(corrected_location) or corrected_location == "":
-                    corrected_location = "Onbekend"
-                label = f"{row[column_vars['Datum']]} {row[column_vars['Van']]}-{row[column_vars['Tot']]} - {row[column_vars['Beschrijving NL']]}"
-                allen_inclusion[idx] = st.checkbox(label, value=True, key=f"allen_inclusion_{idx}")
-                st.text_input("Locatie", value=corrected_location, key=f"allen_loc_{idx}")
-            st.session_state.allen_inclusion = allen_inclusion
-        dbg("'Allen' voorbeeldregels (max 5)", allen_rows.head())
+            allen_selector(allen_table, allen_state)
+        allen_inclusion = {idx: idx not in allen_state["excluded"] for idx in allen_table["orig_idx"]}
+        location_overrides = dict(allen_state["locations"])
+        dbg("'Allen' voorbeeldregels (max 5)", allen_table.head())
 
 # Docenten kiezen
 selected_docenten = []
-if df is not None and columns_set:
-    with safe_section("Docentenlijst opbouwen en selectie"):
+if roster is not None:
+    with safe_section("Docentenlijst opbouwen en selectie", "teachers"):
         st.markdown("## Selecteer docent(en)")
-        docenten_set = set()
-        for cell in df[column_vars["Docenten"]].dropna().astype(str):
-            for teacher in split_docenten(cell):
-                docenten_set.add(teacher.strip().lower())
-        docenten = sorted(docenten_set)
+        docenten = cached_teachers(source_key, tuple(column_vars.items()), roster)
         st.write("Gevonden docenten:", ", ".join(docenten) if docenten else "— niets gevonden —")
-        selected_docenten = st.multiselect("Kies docent(en)", docenten)
+        if previous_digest and st.checkbox("Alleen docenten met wijzigingen", value=True, key="only_changed"):
+            changed = changes["teachers"] | (set(docenten) if include_allen_var and changes["allen"] else set())
+            docenten = [d for d in docenten if d in changed] + sorted(changes["teachers"] - set(docenten))
+            st.write(f"{len(docenten)} docent(en) met wijzigingen:", ", ".join(docenten) or "— geen —")
+        export_all = st.checkbox("Alle docenten exporteren", value=False, key="export_all")
+        selected_docenten = docenten if export_all else st.multiselect("Kies docent(en)", docenten)
         if selected_docenten: st.success("Docenten geselecteerd!")
 
 # Download
-if df is not None and selected_docenten:
-    with safe_section("ICS genereren en downloadknoppen tonen"):
+if roster is not None and selected_docenten:
+    with safe_section("ICS genereren en downloadknoppen tonen", "export") as export_metrics:
         st.markdown("## Download agenda-bestanden")
+        artifact_cache = get_artifact_cache()
+        base_key = (
+            source_key, tuple(column_vars.items()), include_allen_var,
+            tuple(sorted(idx for idx, keep in allen_inclusion.items() if not keep)) if include_allen_var else (),
+            tuple(sorted(location_overrides.items())) if include_allen_var else (),
+            previous_digest, tuple(sorted(history.items())),
+        )
+        results = {docent: artifact_cache.get(base_key + (docent,)) for docent in selected_docenten}
+        missing = [docent for docent, result in results.items() if result is None]
+        export_metrics.update(teachers=len(selected_docenten), cache_hits=len(selected_docenten) - len(missing))
+        if missing:
+            # Alleen wat nog niet in de cache zit; het rooster is één keer voorbereid,
+            # bij meerdere docenten parallel over `workers` processen.
+            progress_bar = st.progress(0.0, text="Agenda's genereren...")
+
+            def store(docent, ics_bytes, docent_warnings):
+                results[docent] = (ics_bytes, docent_warnings)
+                artifact_cache.put(base_key + (docent,), results[docent], _artifact_size(ics_bytes, docent_warnings))
+
+            teacher_stats = {}
+            with metrics.stage("generate", teachers=len(missing), workers=int(workers)):
+                generate_all(roster, column_vars, missing, include_allen_var, allen_inclusion,
+                             workers=int(workers), location_overrides=location_overrides, on_result=store,
+                             export_state=export_state, stats=teacher_stats, history=history,
+                             progress=lambda done, total, docent: progress_bar.progress(done / total,
+                                                                                       text=f"{done}/{total}: {docent}"))
+                metrics.record_generation(teacher_stats)
+            progress_bar.empty()
+            if debug_mode and history != history_options():
+                report = history_size_report(roster, column_vars, missing, teacher_stats, include_allen_var,
+                                             allen_inclusion, location_overrides, export_state, int(workers))
+                dbg("Besparing t.o.v. volledige lesgeschiedenis", format_size_report(report))
+        dbg("Agenda-cache", artifact_cache.stats())
+
         ics_dict = {}
         for docent in selected_docenten:
-            with st.spinner(f"Genereer ICS voor {docent}..."):
-                ics_bytes = cached_generate_ics_bytes(docent, df, column_vars, include_allen_var)
+            ics_bytes, warnings = results[docent]
+            show_warnings(warnings)
             if ics_bytes:
                 ics_dict[docent] = ics_bytes
                 st.download_button(
@@ -450,22 +436,65 @@ if df is not None and selected_docenten:
 
         # Alles in een ZIP
         try:
-            zip_file_path = "/tmp/docenten_ics.zip"
-            with zipfile.ZipFile(zip_file_path, "w") as zipf:
-                for docent, ics_bytes in ics_dict.items():
-                    zipf.writestr(f"{docent}.ics", ics_bytes)
-            with open(zip_file_path, "rb") as f:
-                st.download_button(
-                    label="Download alle agenda-bestanden als ZIP",
-                    data=f.read(),
-                    file_name="alle_docenten.ics.zip",
-                    mime="application/zip"
-                )
+            st.download_button(
+                label="Download alle agenda-bestanden als ZIP",
+                data=session_zip_bytes(ics_dict, zip_level),
+                file_name="alle_docenten.ics.zip",
+                mime="application/zip"
+            )
             dbg("ZIP samengesteld met docenten", list(ics_dict.keys()))
         except Exception as e:
             st.error(f"Er is een fout opgetreden bij het maken van het ZIP-bestand:\n{e}")
             if debug_mode: st.code(traceback.format_exc())
 
+        # Agenda's per studentgroep en per zaal, in één doorloop van het rooster
+        if st.checkbox("Ook agenda's per studentgroep en per zaal (ZIP)", value=False, key="export_views"):
+            views_result = artifact_cache.get(base_key + ("views",))
+            if views_result is None:
+                view_warnings, view_stats = [], {}
+                with metrics.stage("views") as rec:
+                    views = generate_views(roster, column_vars, ["groep", "zaal"], None, include_allen_var,
+                                           allen_inclusion, view_warnings, location_overrides, export_state, history,
+                                           view_stats)
+                    rec.update(groep=view_stats["groep"]["calendars"], zaal=view_stats["zaal"]["calendars"])
+                views_result = ({f"{view}/{calendar_filename(name)}": ics_bytes
+                                 for view in ("groep", "zaal") for name, ics_bytes in views[view].items()},
+                                view_warnings)
+                artifact_cache.put(base_key + ("views",), views_result,
+                                   sum(_artifact_size(b, []) for b in views_result[0].values()))
+            view_dict, view_warnings = views_result
+            show_warnings(view_warnings)
+            st.download_button(
+                label=f"Download {len(view_dict)} agenda's per groep en zaal als ZIP",
+                data=session_zip_bytes(view_dict, zip_level, slot="views_zip_cache"),
+                file_name="groepen_en_zalen.ics.zip",
+                mime="application/zip"
+            )
+            dbg("Agenda's per groep/zaal", list(view_dict))
+
+        # Exportstatus voor de volgende keer (UID's en SEQUENCE blijven dan stabiel)
+        st.download_button(
+            label="Download exportstatus (voor de volgende export)",
+            data=export_state_bytes,
+            file_name="rooster_status.json",
+            mime="application/json"
+        )
+
+# Metingen van deze rerun wegschrijven; in debug-modus het profiel van de laatste runs
+metrics.flush()
+if metrics.records:
+    runs = st.session_state.setdefault("metrics_runs", [])
+    runs.append((metrics.run_id, metrics.records))
+    del runs[:-10]
+if debug_mode and st.session_state.get("metrics_runs"):
+    with st.expander("⏱️ Profiel per run (flame-overzicht)", expanded=False):
+        runs = st.session_state.metrics_runs[::-1]
+        labels = [f"{run_id} – {sum(r['seconds'] for r in records if '/' not in r['path']):.2f}s"
+                  for run_id, records in runs]
+        choice = st.selectbox("Run (nieuwste eerst)", range(len(runs)), format_func=labels.__getitem__,
+                              key="metrics_run")
+        st.code(flame_text(runs[choice][1]))
+
 # Tips
 st.caption("""
 Als je een **AxiosError: timeout exceeded** ziet in de front-end:
@@ -0,0 +1,139 @@
+"""Exportstatus: stabiele UID's, SEQUENCE en annuleringen bij een volgende export."""
+import pandas as pd
+from icalendar import Calendar
+
+from rooster_engine import build_export_state, generate_all, generate_views, normalize_roster
+
+COLUMN_VARS = {role: role for role in
+               ["Datum", "Van", "Tot", "Student groep", "Zaal", "Beschrijving NL", "Docenten"]}
+
+
+def roster_df():
+    return pd.DataFrame({
+        "Datum": ["01-09-2025", "08-09-2025", "15-09-2025", "02-09-2025"],
+        "Van": ["08:30", "08:30", "08:30", "13:00"], "Tot": ["10:00", "10:00", "10:00", "15:00"],
+        "Student groep": ["CRIM-1A", "CRIM-1A", "CRIM-1A", "MED-2B"],
+        "Zaal": ["B.1.12", "B.1.12", "B.1.12", "A.0.01"],
+        "Beschrijving NL": ["Ethiek 1", "Ethiek 2", "Ethiek 3", "Statistiek"],
+        "Docenten": ["Sanne/Joost", "Sanne", "Joost", "Marie"],
+    }, dtype=object)
+
+
+def export(df, previous=None):
+    roster = normalize_roster(df, COLUMN_VARS)
+    state, changes = build_export_state(roster, COLUMN_VARS, previous)
+    return roster, state, changes
+
+
+def uid_of(roster, orig_idx):
+    rows = roster["rows"]
+    return rows.loc[rows["orig_idx"] == orig_idx, "_uid"].item()
+
+
+def vevents(ics_bytes):
+    return {str(e["UID"]): e for e in Calendar.from_ical(ics_bytes).walk("VEVENT")}
+
+
+def test_reassigned_lesson_is_cancelled_for_dropped_teachers():
+    _, first, _ = export(roster_df())
+    df = roster_df()
+    df.loc[0, "Docenten"] = "Zeus"
+    roster, state, changes = export(df, first)
+    uid = uid_of(roster, 0)
+    assert changes["changed"] == {uid}
+    assert {"sanne", "joost", "zeus"} <= changes["teachers"]
+
+    ics = generate_all(roster, COLUMN_VARS, ["sanne", "joost", "zeus"], export_state=state)
+    for docent in ("sanne", "joost"):
+        event = vevents(ics[docent])[uid]
+        assert event["STATUS"] == "CANCELLED" and int(event["SEQUENCE"]) == 1
+    event = vevents(ics["zeus"])[uid]
+    assert "STATUS" not in event and int(event["SEQUENCE"]) == 1
+
+    views = generate_views(roster, COLUMN_VARS, ["docent"], ["sanne", "joost", "zeus"], export_state=state)
+    assert views["docent"] == ics
+
+
+def test_moved_lesson_is_cancelled_in_old_room():
+    _, first, _ = export(roster_df())
+    df = roster_df()
+    df.loc[1, "Zaal"] = "C.2.01"
+    roster, state, _ = export(df, first)
+    uid = uid_of(roster, 1)
+    views = generate_views(roster, COLUMN_VARS, ["zaal"], export_state=state)
+    assert "STATUS" not in vevents(views["zaal"]["C.2.01"])[uid]
+    assert vevents(views["zaal"]["B.1.12"])[uid]["STATUS"] == "CANCELLED"
+
+
+def test_room_left_empty_still_gets_its_cancellation():
+    _, first, _ = export(roster_df())
+    df = roster_df()
+    df.loc[3, "Zaal"] = "R9"  # de enige les in A.0.01
+    roster, state, _ = export(df, first)
+    uid = uid_of(roster, 3)
+    views = generate_views(roster, COLUMN_VARS, ["zaal"], export_state=state)
+    assert sorted(views["zaal"]) == ["A.0.01", "B.1.12", "R9"]
+    assert list(vevents(views["zaal"]["A.0.01"])) == [uid]
+    assert vevents(views["zaal"]["A.0.01"])[uid]["STATUS"] == "CANCELLED"
+
+
+def test_group_left_empty_still_gets_its_cancellation():
+    _, first, _ = export(roster_df())
+    roster, state, changes = export(roster_df().drop(index=3), first)  # de enige les van MED-2B
+    views = generate_views(roster, COLUMN_VARS, ["groep", "zaal"], export_state=state)
+    (uid,) = changes["removed"]
+    for view, name in (("groep", "MED-2B"), ("zaal", "A.0.01")):
+        assert vevents(views[view][name])[uid]["STATUS"] == "CANCELLED"
+
+
+def test_lesson_moved_to_other_group_is_cancelled_in_old_group():
+    _, first, _ = export(roster_df())
+    df = roster_df()
+    df.loc[1, "Student groep"] = "CRIM-1B"
+    roster, state, changes = export(df, first)
+    assert len(changes["added"]) == 1 and len(changes["removed"]) == 1
+    views = generate_views(roster, COLUMN_VARS, ["groep"], export_state=state)
+    assert vevents(views["groep"]["CRIM-1A"])[changes["removed"].pop()]["STATUS"] == "CANCELLED"
+    assert "STATUS" not in vevents(views["groep"]["CRIM-1B"])[changes["added"].pop()]
+
+
+def test_unchanged_export_has_no_cancellations():
+    _, first, _ = export(roster_df())
+    roster, state, changes = export(roster_df(), first)
+    assert not (changes["added"] or changes["changed"] or changes["removed"])
+    for ics in generate_all(roster, COLUMN_VARS, export_state=state).values():
+        assert b"CANCELLED" not in ics
+
+
+def test_series_neighbours_get_new_sequence_when_their_description_changes():
+    _, first, _ = export(roster_df())
+    roster, state, changes = export(roster_df().drop(index=2), first)
+    assert changes["removed"] and not changes["changed"]
+    assert changes["refreshed"] == {uid_of(roster, 0), uid_of(roster, 1)}
+
+    ics = generate_all(roster, COLUMN_VARS, export_state=state)
+    for uid in changes["refreshed"]:
+        assert int(vevents(ics["sanne"])[uid]["SEQUENCE"]) == 1
+    statistiek = vevents(ics["marie"])[uid_of(roster, 3)]
+    assert int(statistiek["SEQUENCE"]) == 0
+
+
+def test_dtstamp_is_stable_between_unchanged_exports():
+    first_roster, first, _ = export(roster_df())
+    roster, state, _ = export(roster_df(), first)
+    before = generate_all(first_roster, COLUMN_VARS, export_state=first)
+    assert generate_all(roster, COLUMN_VARS, export_state=state) == before
+    for ics in before.values():
+        assert all("DTSTAMP" in event for event in vevents(ics).values())
+
+
+def test_lesson_moved_to_another_day_keeps_its_uid():
+    first_roster, first, _ = export(roster_df())
+    df = roster_df()
+    df.loc[1, ["Datum", "Van"]] = ["10-09-2025", "13:00"]
+    roster, state, changes = export(df, first)
+    uid = uid_of(roster, 1)
+    assert uid == uid_of(first_roster, 1)
+    assert changes["changed"] == {uid} and not changes["added"] and not changes["removed"]
+    event = vevents(generate_all(roster, COLUMN_VARS, ["sanne"], export_state=state)["sanne"])[uid]
+    assert int(event["SEQUENCE"]) == 1 and "STATUS" not in event
@@ -0,0 +1,101 @@
+"""Feed-server tegen een lokale client (poort 0, eigen thread)."""
+import gzip
+import http.client
+import threading
+from email.utils import formatdate
+
+import pytest
+
+from rooster_feed import FeedServer, FeedStore
+
+BODY = b"BEGIN:VCALENDAR\r\nVERSION:2.0\r\nEND:VCALENDAR\r\n"
+LOADED = 1_750_000_000
+
+
+@pytest.fixture
+def server():
+    store = FeedStore()
+    store.update({"piet": BODY}, {"piet"}, now=LOADED)
+    srv = FeedServer(("127.0.0.1", 0), store)
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def request(server, path, method="GET", headers=None):
+    conn = http.client.HTTPConnection(*server.server_address[:2], timeout=5)
+    try:
+        conn.request(method, path, headers=headers or {})
+        response = conn.getresponse()
+        return response, response.read()
+    finally:
+        conn.close()
+
+
+def test_get_plain_and_gzip(server):
+    response, body = request(server, "/feeds/piet.ics")
+    assert response.status == 200 and body == BODY
+    assert response.getheader("Content-Type") == "text/calendar; charset=utf-8"
+    assert response.getheader("Content-Encoding") is None
+
+    response, body = request(server, "/feeds/Piet.ics", headers={"Accept-Encoding": "gzip"})
+    assert response.status == 200
+    assert response.getheader("Content-Encoding") == "gzip"
+    assert response.getheader("Vary") == "Accept-Encoding"
+    assert gzip.decompress(body) == BODY
+
+
+def test_not_modified_via_etag(server):
+    response, _ = request(server, "/feeds/piet.ics")
+    etag = response.getheader("ETag")
+    response, body = request(server, "/feeds/piet.ics", headers={"If-None-Match": etag})
+    assert response.status == 304 and body == b""
+    assert response.getheader("ETag") == etag
+
+    response, _ = request(server, "/feeds/piet.ics", headers={"If-None-Match": '"iets-anders"'})
+    assert response.status == 200
+
+
+def test_not_modified_via_last_modified(server):
+    response, _ = request(server, "/feeds/piet.ics")
+    assert response.getheader("Last-Modified") == formatdate(LOADED, usegmt=True)
+    response, body = request(server, "/feeds/piet.ics",
+                             headers={"If-Modified-Since": formatdate(LOADED, usegmt=True)})
+    assert response.status == 304 and body == b""
+    response, _ = request(server, "/feeds/piet.ics",
+                          headers={"If-Modified-Since": formatdate(LOADED - 60, usegmt=True)})
+    assert response.status == 200
+
+
+def test_not_found(server):
+    response, _ = request(server, "/feeds/onbekend.ics")
+    assert response.status == 404
+    response, _ = request(server, "/iets-anders")
+    assert response.status == 404
+
+
+def test_head_has_headers_without_body(server):
+    response, body = request(server, "/feeds/piet.ics", method="HEAD")
+    assert response.status == 200 and body == b""
+    assert int(response.getheader("Content-Length")) == len(BODY)
+    assert response.getheader("ETag")
+
+
+def test_feed_list(server):
+    response, body = request(server, "/feeds/")
+    assert response.status == 200 and body == b"/feeds/piet.ics\n"
+
+
+def test_update_keeps_last_modified_for_unchanged_body():
+    store = FeedStore()
+    store.update({"piet": BODY, "anna": BODY}, {"piet", "anna"}, now=LOADED)
+    store.update({"piet": BODY, "anna": BODY + b"X"}, {"piet", "anna"}, now=LOADED + 60)
+    assert store.get("piet")["last_modified"] == LOADED
+    assert store.get("anna")["last_modified"] == LOADED + 60
+    assert store.get("piet")["etag"] != store.get("anna")["etag"]
+
+    store.update({}, {"piet"}, now=LOADED + 120)  # niet opnieuw gegenereerd: feed blijft; anna verdwijnt
+    assert store.names() == ["piet"]
+    assert store.get("piet")["last_modified"] == LOADED
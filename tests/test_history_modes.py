@@ -0,0 +1,127 @@
+"""Lesgeschiedenis in eventbeschrijvingen: history_options en de modi full/window/horizon/off."""
+import re
+
+import pandas as pd
+import pytest
+from icalendar import Calendar
+
+from rooster_engine import (
+    _nearest_positions, generate_ics_bytes, get_future_series_teachers, get_lesson_history, history_options,
+    normalize_roster, select_records,
+)
+
+COLUMN_VARS = {role: role for role in
+               ["Datum", "Van", "Tot", "Student groep", "Zaal", "Beschrijving NL", "Docenten"]}
+DATES = ["01-09-2025", "08-09-2025", "15-09-2025", "22-09-2025", "29-09-2025", "06-10-2025"]
+
+
+def roster_of(descs, teachers, dates=DATES):
+    df = pd.DataFrame({"Datum": dates, "Van": "08:30", "Tot": "10:00", "Student groep": "CRIM-1A",
+                       "Zaal": "B.1.12", "Beschrijving NL": descs, "Docenten": teachers}, dtype=object)
+    return normalize_roster(df, COLUMN_VARS)
+
+
+def history(roster, pos, history_type, **kwargs):
+    return get_lesson_history(roster["history_index"], "Piet", "CRIM-1A", pos, history_type, "Ethiek", **kwargs)
+
+
+def descriptions(ics_bytes):
+    cal = Calendar.from_ical(ics_bytes)
+    caldesc = cal.get("X-WR-CALDESC")  # onbekende eigenschap voor icalendar: zelf ontsnappen ongedaan maken
+    if caldesc is not None:
+        caldesc = re.sub(r"\\(.)", lambda m: "\n" if m.group(1) in "nN" else m.group(1), str(caldesc))
+    return caldesc, [str(event["DESCRIPTION"]) for event in cal.walk("VEVENT")]
+
+
+@pytest.fixture
+def lessons():
+    """Zes wekelijkse lessen Ethiek van Piet plus één zonder geldige datum (die sorteert achteraan)."""
+    return roster_of("Ethiek", "Piet", DATES + ["geen datum"])
+
+
+@pytest.fixture
+def series():
+    """Eén serie Ethiek 1–6 voor CRIM-1A, om en om gegeven door Piet en Klaas."""
+    return roster_of([f"Ethiek {i}" for i in range(1, 7)], ["Piet", "Klaas"] * 3)
+
+
+def test_history_options_defaults_and_validation():
+    assert history_options() == {"mode": "full", "count": 3, "days": 28, "compact": False}
+    with pytest.raises(ValueError):
+        history_options("alles")
+    with pytest.raises(ValueError):
+        history_options("window", count=0)
+    with pytest.raises(ValueError):
+        history_options("horizon", days=-1)
+    assert history_options("horizon", days=0)["days"] == 0
+
+
+def test_nearest_positions_keeps_order_and_counts_unique_lines(lessons):
+    index = lessons["history_index"]
+    assert _nearest_positions([0, 1, 2, 3], index, 4, True, 2, None) == [2, 3]
+    assert _nearest_positions([5, 6], index, 4, False, 1, None) == [5]
+    # dezelfde regel twee keer telt maar één keer mee voor de limiet
+    assert _nearest_positions([1, 2, 2, 3], index, 4, True, 2, None) == [2, 2, 3]
+    assert _nearest_positions([0, 1, 2, 3], index, 4, True, None, pd.Timedelta(days=14)) == [2, 3]
+
+
+@pytest.mark.parametrize("count", [1, 2, 3])
+def test_window_gives_exactly_count_previous_and_next(lessons, count):
+    full_prev, full_next = history(lessons, 3, "previous"), history(lessons, 3, "future")
+    assert history(lessons, 3, "previous", limit=count) == full_prev[-count:]
+    assert history(lessons, 3, "future", limit=count) == full_next[:count]
+    assert len(history(lessons, 0, "previous", limit=count)) == 0
+
+
+def test_window_limits_series_overview(series):
+    first = select_records(series["rows"], [0])[0]
+    full = get_future_series_teachers(first, series["series_index"], COLUMN_VARS)
+    assert len(full) == 5
+    assert get_future_series_teachers(first, series["series_index"], COLUMN_VARS, limit=2) == full[:2]
+
+
+def test_horizon_cuts_off_by_days_and_skips_nat(lessons):
+    two_weeks = pd.Timedelta(days=14)
+    assert history(lessons, 2, "previous", horizon=two_weeks) == \
+        ["Ethiek , maandag 01 september 2025", "Ethiek , maandag 08 september 2025"]
+    assert history(lessons, 4, "future", horizon=two_weeks) == ["Ethiek , maandag 06 oktober 2025"]
+    assert history(lessons, 5, "future") == ["Ethiek , onbekende datum"]
+    assert history(lessons, 5, "future", horizon=two_weeks) == []
+    # vanaf een les zonder datum valt alles buiten de horizon
+    assert history(lessons, 6, "previous", horizon=two_weeks) == []
+    assert history(lessons, 2, "previous", horizon=pd.Timedelta(days=0)) == []
+
+
+def test_horizon_limits_series_overview(series):
+    first = select_records(series["rows"], [0])[0]
+    lines = get_future_series_teachers(first, series["series_index"], COLUMN_VARS, horizon=pd.Timedelta(days=14))
+    assert [line.split(" – ")[1] for line in lines] == ["Ethiek 2", "Ethiek 3"]
+
+
+def test_full_is_unchanged(lessons, series):
+    for roster in (lessons, series):
+        default = generate_ics_bytes("Piet", roster, COLUMN_VARS)
+        assert generate_ics_bytes("Piet", roster, COLUMN_VARS, history=history_options()) == default
+        assert generate_ics_bytes("Piet", roster, COLUMN_VARS, history=history_options("window", count=10)) == \
+            default
+    caldesc, events = descriptions(generate_ics_bytes("Piet", lessons, COLUMN_VARS))
+    assert caldesc is None
+    assert events[0].count("\nEthiek , ") == 6  # alle komende lessen, ook die zonder datum
+
+
+def test_off_drops_history_and_series(series):
+    caldesc, events = descriptions(generate_ics_bytes("Piet", series, COLUMN_VARS,
+                                                      history=history_options("off", compact=True)))
+    assert caldesc is None
+    assert events == [f"Ethiek {i} - Groep: CRIM-1A\nLokaal: B.1.12" for i in (1, 3, 5)]
+
+
+@pytest.mark.parametrize("writer", ["stream", "icalendar"])
+def test_compact_moves_series_to_calendar_description(series, writer):
+    caldesc, events = descriptions(generate_ics_bytes("Piet", series, COLUMN_VARS, writer=writer,
+                                                      history=history_options(compact=True)))
+    assert caldesc.startswith("Serie ethiek – CRIM-1A:\n")
+    assert caldesc.count(" (lokaal: B.1.12)") == 6
+    reference = "Andere lessen in deze serie: zie de agendabeschrijving (serie ethiek – CRIM-1A)."
+    assert len(events) == 3 and all(event.endswith(reference) for event in events)
+    assert not any("(lokaal:" in event for event in events)
@@ -0,0 +1,120 @@
+"""De streaming-writer tegen de icalendar-referentie, en het vouwen van regels."""
+import pandas as pd
+import pytest
+from icalendar import Calendar
+
+from ics_writer import CRLF, FOLD_LIMIT, escape_text, fold_line
+from rooster_engine import build_export_state, generate_ics_bytes, history_options, normalize_roster
+
+COLUMN_VARS = {role: role for role in
+               ["Datum", "Van", "Tot", "Student groep", "Zaal", "Beschrijving NL", "Docenten"]}
+
+DESCRIPTIONS = [
+    "Anamnesetraining 1",
+    "Komma's, puntkomma's; en een backslash \\ in de tekst",
+    "Regels\r\nmet CR/LF\nen\rlosse CR",
+    "Ëén café, één naïeve Zoë – “aanhalingstekens” 📅",
+    "Heel lange beschrijving " + "met véél tekst, ook ; en \\ " * 12,
+    "Anamnesetraining 2",
+]
+
+
+def roster_df():
+    n = len(DESCRIPTIONS)
+    return pd.DataFrame({
+        "Datum": [f"{d:02d}-09-2025" for d in range(1, n + 1)],
+        "Van": ["08:30"] * n, "Tot": ["10:00"] * n,
+        "Student groep": ["CRIM-1A"] * (n - 1) + ["CRIM-1A;B"],
+        "Zaal": ["B.1.12", "Zaal, groot", "A\\0", "Aula Ü", "B.1.12", None],
+        "Beschrijving NL": DESCRIPTIONS,
+        "Docenten": ["Piet", "Piet, Klaas", "Piet/Anna", "Piet", "Piet", "Piet"],
+    }, dtype=object)
+
+
+def events(ics_bytes):
+    """VEVENT's als {UID: {property: waarde als tekst}}, in volgorde."""
+    cal = Calendar.from_ical(ics_bytes)
+    out = {}
+    for component in cal.walk("VEVENT"):
+        out[str(component["UID"])] = {name: component[name].to_ical().decode("utf-8") if hasattr(
+            component[name], "to_ical") else str(component[name]) for name in component}
+    return cal, out
+
+
+@pytest.mark.parametrize("history", [None, history_options("window", count=2), history_options(compact=True)])
+def test_stream_matches_icalendar(history):
+    roster = normalize_roster(roster_df(), COLUMN_VARS)
+    previous, _ = build_export_state(roster, COLUMN_VARS)
+    changed = normalize_roster(roster_df().drop(index=1), COLUMN_VARS)  # één les vervalt: een annulering
+    export_state, _ = build_export_state(changed, COLUMN_VARS, previous)
+
+    stream = generate_ics_bytes("piet", changed, COLUMN_VARS, writer="stream", export_state=export_state,
+                                history=history)
+    reference = generate_ics_bytes("piet", changed, COLUMN_VARS, writer="icalendar", export_state=export_state,
+                                   history=history)
+    stream_cal, stream_events = events(stream)
+    reference_cal, reference_events = events(reference)
+    assert list(stream_events) == list(reference_events)
+    assert len(stream_events) == len(DESCRIPTIONS)
+    for uid, fields in reference_events.items():
+        assert stream_events[uid] == fields
+    assert stream_cal.get("X-WR-CALDESC") == reference_cal.get("X-WR-CALDESC")
+    assert any(fields.get("STATUS") == "CANCELLED" for fields in stream_events.values())
+
+
+def test_text_round_trips():
+    roster = normalize_roster(roster_df(), COLUMN_VARS)
+    cal = Calendar.from_ical(generate_ics_bytes("piet", roster, COLUMN_VARS))
+    summaries = [str(event["SUMMARY"]) for event in cal.walk("VEVENT")]
+    for desc, summary in zip(DESCRIPTIONS, summaries):
+        assert summary.startswith(desc.replace("\r\n", "\n").replace("\r", "\n") + " - Piet")
+
+
+def test_escape_text_normalizes_line_breaks():
+    assert escape_text("a\r\nb\rc\nd") == "a\\nb\\nc\\nd"
+    assert escape_text("x,y;z\\") == "x\\,y\\;z\\\\"
+
+
+def test_all_lines_within_fold_limit():
+    roster = normalize_roster(roster_df(), COLUMN_VARS)
+    ics = generate_ics_bytes("piet", roster, COLUMN_VARS, history=history_options(compact=True))
+    assert ics.endswith(CRLF)
+    for line in ics.split(CRLF):
+        assert len(line) <= FOLD_LIMIT
+        line.decode("utf-8")  # geen half UTF-8-teken aan het eind van een regel
+
+
+def test_fold_line_short_line_unchanged():
+    line = b"SUMMARY:" + b"x" * (FOLD_LIMIT - 8)
+    assert fold_line(line) == line + CRLF
+
+
+@pytest.mark.parametrize("text", ["a" * 200, "é" * 100, "📅" * 50, "aé" * 80, "x" + "📅" * 40])
+def test_fold_line_limit_and_utf8(text):
+    line = f"DESCRIPTION:{text}".encode("utf-8")
+    folded = fold_line(line)
+    physical = folded[:-len(CRLF)].split(CRLF)
+    assert all(len(p) <= FOLD_LIMIT for p in physical)
+    assert all(p.startswith(b" ") for p in physical[1:])
+    for p in physical:
+        p.decode("utf-8")  # elke fysieke regel is op zichzelf geldige UTF-8
+    assert b"".join([physical[0]] + [p[1:] for p in physical[1:]]) == line
+
+
+def test_fold_line_keeps_escapes_together():
+    line = ("DESCRIPTION:" + "a" * (FOLD_LIMIT - 13) + "\\,b" * 30).encode("utf-8")
+    physical = fold_line(line)[:-len(CRLF)].split(CRLF)
+    assert not any(p.endswith(b"\\") for p in physical)
+    assert b"".join([physical[0]] + [p[1:] for p in physical[1:]]) == line
+
+
+@pytest.mark.parametrize("prefix", [FOLD_LIMIT - 2, FOLD_LIMIT - 1, FOLD_LIMIT])
+@pytest.mark.parametrize("text", ["\\", "\\\\", "\\,", ","])
+def test_fold_line_escape_at_boundary(prefix, text):
+    line = ("DESCRIPTION:".ljust(prefix, "a") + escape_text(text) + "b" * 100).encode("utf-8")
+    physical = fold_line(line)[:-len(CRLF)].split(CRLF)
+    for p in physical:
+        body = p.lstrip(b" ")
+        trailing = len(body) - len(body.rstrip(b"\\"))
+        assert trailing % 2 == 0, p  # nooit een losse '\' aan het eind van een regel
+    assert b"".join([physical[0]] + [p[1:] for p in physical[1:]]) == line
@@ -0,0 +1,68 @@
+"""get_lesson_history (index) tegen de oorspronkelijke iterrows-implementatie."""
+import random
+
+import pandas as pd
+import pytest
+
+from rooster_engine import dutch_date_str, get_lesson_history, normalize_roster, split_docenten
+
+COLUMN_VARS = {role: role for role in
+               ["Datum", "Van", "Tot", "Student groep", "Zaal", "Beschrijving NL", "Docenten"]}
+
+
+def baseline_lesson_history(selected_columns, docent, group, current_pos, df_sorted, history_type, current_desc=None):
+    """De implementatie van vóór de index: elke keer alle rijen van de docent (of 'allen') doorlopen."""
+    lessons = []
+    docent_l = (docent or "").strip().lower()
+    rows = df_sorted.iloc[:current_pos] if history_type == "previous" else df_sorted.iloc[current_pos + 1:]
+    for _, row in rows.iterrows():
+        teachers_in_row = [t.strip().lower() for t in split_docenten(row.get(selected_columns["Docenten"], ""))]
+        same_teacher = docent_l in teachers_in_row
+        same_group = row.get(selected_columns["Student groep"]) == group
+        same_desc = (current_desc is None) or (row.get(selected_columns["Beschrijving NL"]) == current_desc)
+        if same_teacher and same_group and same_desc:
+            lessons.append(f"{row.get(selected_columns['Beschrijving NL'], '')} , {dutch_date_str(row.get('_dt'))}")
+    return list(dict.fromkeys(lessons))
+
+
+def random_roster(seed, rows=150):
+    rnd = random.Random(seed)
+    descs = ["Anamnesetraining 1", "Anamnesetraining 2", "Practicum ECG", "Intervisie", " Intervisie ", 12, None,
+             float("nan")]
+    groups = ["CRIM-1A", "CRIM-1B", "MED-2A", None, float("nan")]
+    dates = [f"{d:02d}-09-2025" for d in range(1, 29)] + ["geen datum"]
+    teachers = ["Piet", "piet, Klaas", "Anna/Jan", "Klaas; Anna", "allen", "Allen", "Piet, allen", "", None]
+    return pd.DataFrame([{
+        "Datum": rnd.choice(dates),
+        "Van": rnd.choice(["08:30", "10:15", "13:00"]),
+        "Tot": rnd.choice(["10:00", "12:00", "15:00"]),
+        "Student groep": rnd.choice(groups),
+        "Zaal": rnd.choice(["B.1.12", "A.0.01"]),
+        "Beschrijving NL": rnd.choice(descs),
+        "Docenten": rnd.choice(teachers),
+    } for _ in range(rows)], dtype=object)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_baseline(seed):
+    roster = normalize_roster(random_roster(seed), COLUMN_VARS)
+    rows, index = roster["rows"], roster["history_index"]
+    allen_only = rows["_allen_only"].to_numpy()
+    checked = 0
+    for docent in ["Piet", "Klaas", "Anna", "Jan", "allen"]:
+        # zoals iter_events: 'allen' alleen over de allen-only rijen, een docent nooit daarover
+        if docent == "allen":
+            positions = allen_only.nonzero()[0]
+        else:
+            positions = [pos for pos, cell in enumerate(rows["Docenten"])
+                         if docent.lower() in [t.lower() for t in split_docenten(cell)] and not allen_only[pos]]
+        own = rows.iloc[positions].reset_index(drop=True)
+        for pos, base_pos in enumerate(positions):
+            group, desc = own.at[pos, "Student groep"], own.at[pos, "Beschrijving NL"]
+            for history_type in ("previous", "future"):
+                for current_desc in (desc, None):
+                    assert get_lesson_history(index, docent, group, base_pos, history_type, current_desc,
+                                              allen_only=docent == "allen") == \
+                        baseline_lesson_history(COLUMN_VARS, docent, group, pos, own, history_type, current_desc)
+                    checked += 1
+    assert checked > 500
@@ -0,0 +1,96 @@
+"""Kolomherkenning (profile_columns) op inhoud en kolomnaam."""
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from rooster_cli import resolve_columns
+from rooster_engine import COLUMN_ROLES, LOW_CONFIDENCE, profile_columns
+from rooster_synth import make_roster
+
+N = 40
+
+
+def lessons(n=N):
+    """Roosterinhoud per rol, zonder kolomnamen."""
+    return {
+        "Datum": [f"{1 + i % 28:02d}-09-2025" for i in range(n)],
+        "Van": ["08:30", "10:15", "13:00", "15:00"] * (n // 4),
+        "Tot": ["10:00", "12:00", "14:45", "17:00"] * (n // 4),
+        "Student groep": [f"CRIM-{1 + i % 3}{'AB'[i % 2]}" for i in range(n)],
+        "Zaal": [f"B.{i % 3}.{10 + i % 7}" for i in range(n)],
+        "Beschrijving NL": [f"Werkgroep Daders & Slachtoffers {1 + i % 8}" for i in range(n)],
+        "Docenten": [["Piet", "Klaas, Anna", "Jan/Marie"][i % 3] for i in range(n)],
+    }
+
+
+def frame(headers, n=N):
+    return pd.DataFrame({header: values for header, values in zip(headers, lessons(n).values())})
+
+
+def test_synthetic_roster_with_repo_headers():
+    df = make_roster(200, seed=1)
+    profile = profile_columns(df)
+    assert profile["roles"] == {role: role for role in COLUMN_ROLES}
+    assert all(profile["confidence"][role] >= LOW_CONFIDENCE for role in COLUMN_ROLES)
+
+
+def test_numeric_id_column_does_not_win_datum():
+    df = frame(["Wanneer", "Begin", "Einde", "Klas", "Lokaal", "Omschrijving", "Docent"])
+    df.insert(0, "Id", range(45900, 45900 + N))  # lijkt op Excel-datumnummers
+    df.insert(1, "Code", [20250901 + i for i in range(N)])
+    profile = profile_columns(df)
+    assert profile["roles"]["Datum"] == "Wanneer"
+    assert profile["columns"]["Id"]["date"] == 0.0
+
+    no_dates = df.drop(columns="Wanneer")
+    assert profile_columns(no_dates)["roles"]["Datum"] not in ("Id", "Code")
+
+
+@pytest.mark.parametrize("headers", [
+    ["Date", "Start", "End", "Group", "Room", "Description", "Teacher"],
+    ["Lesdatum", "Begintijd", "Eindtijd", "Klas", "Lokaal", "Omschrijving", "Docent(en)"],
+    ["DAG", "van", "tot", "Cohort", "Ruimte", "Activiteit", "Medewerker"],
+])
+def test_renamed_and_localized_headers(headers):
+    assert profile_columns(frame(headers))["roles"] == dict(zip(COLUMN_ROLES, headers))
+
+
+def test_headerless_sheet_detected_from_content():
+    """Zonder kopregel maakt pandas van de eerste les de 'kop'; de inhoud beslist."""
+    data = pd.DataFrame(lessons())
+    first = data.iloc[0].tolist()
+    first[0] = datetime(2025, 9, 1)  # echte Excel-datum als 'kolomnaam'
+    df = pd.DataFrame(data.iloc[1:].to_numpy(), columns=first)
+    roles = profile_columns(df)["roles"]
+    assert roles == dict(zip(COLUMN_ROLES, first))
+
+
+def test_van_tot_swapped_on_content():
+    df = frame(["Datum", "Tijd 1", "Tijd 2", "Groep", "Zaal", "Beschrijving", "Docenten"])
+    df[["Tijd 1", "Tijd 2"]] = df[["Tijd 2", "Tijd 1"]].to_numpy()  # eindtijden in de eerste tijdkolom
+    roles = profile_columns(df)["roles"]
+    assert (roles["Van"], roles["Tot"]) == ("Tijd 2", "Tijd 1")
+
+    df = df.rename(columns={"Tijd 1": "Tot", "Tijd 2": "Van"})
+    roles = profile_columns(df)["roles"]
+    assert (roles["Van"], roles["Tot"]) == ("Van", "Tot")
+
+
+def test_headers_decide_over_content_order():
+    df = frame(["Datum", "Tot", "Van", "Groep", "Zaal", "Beschrijving", "Docenten"])  # namen kloppen niet met inhoud
+    roles = profile_columns(df)["roles"]
+    assert (roles["Van"], roles["Tot"]) == ("Van", "Tot")
+
+
+def test_low_confidence_roles_are_reported():
+    df = frame(["Datum", "Van", "Tot", "Groep", "Zaal", "Beschrijving", "Docenten"])
+    df["Kolom 6"] = df.pop("Beschrijving").str.slice(0, 8)  # kort en zonder herkenbare kop
+    profile = profile_columns(df)
+    weak = [role for role in COLUMN_ROLES if 0 < profile["confidence"][role] < LOW_CONFIDENCE]
+    assert weak == ["Beschrijving NL"]
+    assert all(profile["confidence"][role] >= LOW_CONFIDENCE for role in ("Datum", "Van", "Tot", "Docenten"))
+
+    _, errors, uncertain = resolve_columns(df, [])
+    assert not errors
+    assert [item.split(" -> ")[0] for item in uncertain] == weak
@@ -0,0 +1,42 @@
+"""Inlezen met alleen de gekozen kolommen, ook zonder kopregel."""
+import io
+from datetime import datetime
+
+import pandas as pd
+
+from rooster_engine import (
+    AUTODETECT_SAMPLE_ROWS, normalize_roster, profile_columns, read_roster, read_roster_cached,
+)
+
+
+def headerless_xlsx():
+    """Blad zonder kopregel: de eerste rij is al een les, met een echte Excel-datum."""
+    rows = [[datetime(2025, 9, day), "08:30", "10:00", "CRIM-1A", "B.1.12", f"Ethiek {day}", "Piet, Klaas", day]
+            for day in range(1, 21)]
+    buf = io.BytesIO()
+    pd.DataFrame(rows).to_excel(buf, header=False, index=False)
+    return buf.getvalue()
+
+
+def test_headerless_sheet_with_date_in_first_row(tmp_path):
+    data = headerless_xlsx()
+    preview = read_roster(data, nrows=AUTODETECT_SAMPLE_ROWS)
+    assert not all(isinstance(col, str) for col in preview.columns)
+    column_vars = profile_columns(preview)["roles"]
+    assert column_vars["Datum"] == preview.columns[0]
+
+    usecols = list(dict.fromkeys(column_vars.values()))
+    df = read_roster_cached(data, 0, usecols, cache_dir=str(tmp_path))
+    assert list(df.columns) == [col for col in preview.columns if col in usecols]
+    assert len(df) == len(preview)
+    assert read_roster_cached(data, 0, usecols, cache_dir=str(tmp_path)).equals(df)  # ook uit de cache
+
+    roster = normalize_roster(df, column_vars)
+    assert sorted(roster["teacher_index"]) == ["klaas", "piet"]
+
+
+def test_numeric_header_cells():
+    buf = io.BytesIO()
+    pd.DataFrame({2025: ["a", "b"], "Zaal": ["B.1.12", "A.0.01"], 3.5: [1, 2]}).to_excel(buf, index=False)
+    df = read_roster(buf.getvalue(), usecols=[2025, "Zaal"])
+    assert list(df.columns) == [2025, "Zaal"] and df["Zaal"].tolist() == ["B.1.12", "A.0.01"]
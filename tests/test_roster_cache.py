@@ -0,0 +1,60 @@
+"""Parquet-cache van read_roster_cached: rechten en begrenzing."""
+import hashlib
+import os
+import stat
+import time
+
+import pytest
+
+from rooster_engine import read_roster_cached
+from rooster_synth import make_roster, roster_xlsx_bytes
+
+pytest.importorskip("pyarrow")
+
+
+def xlsx(seed):
+    return roster_xlsx_bytes(make_roster(50, seed=seed))
+
+
+def parquet_files(cache_dir):
+    return sorted(name for name in os.listdir(cache_dir) if name.endswith(".parquet"))
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="POSIX-rechten")
+def test_cache_dir_is_private(tmp_path):
+    cache_dir = tmp_path / "cache"
+    read_roster_cached(xlsx(0), cache_dir=str(cache_dir))
+    assert stat.S_IMODE(os.stat(cache_dir).st_mode) == 0o700
+
+    os.chmod(cache_dir, 0o777)
+    read_roster_cached(xlsx(0), cache_dir=str(cache_dir))
+    assert stat.S_IMODE(os.stat(cache_dir).st_mode) == 0o700
+
+
+def test_cache_hit_returns_same_frame(tmp_path):
+    data = xlsx(0)
+    first = read_roster_cached(data, cache_dir=str(tmp_path))
+    assert len(parquet_files(tmp_path)) == 1
+    assert read_roster_cached(data, cache_dir=str(tmp_path)).equals(first)
+
+
+def test_cache_is_bounded_least_recently_used_first(tmp_path):
+    data = [xlsx(seed) for seed in range(3)]
+    names = [f"{hashlib.sha256(d).hexdigest()}-" for d in data]
+    for d in data[:2]:
+        read_roster_cached(d, cache_dir=str(tmp_path))
+    for age, name in zip((300, 200), parquet_names(tmp_path, names[:2])):
+        t = time.time() - age
+        os.utime(tmp_path / name, (t, t))
+    read_roster_cached(data[0], cache_dir=str(tmp_path))  # hit: data[0] is nu het recentst gebruikt
+
+    sizes = sum(os.path.getsize(tmp_path / name) for name in parquet_files(tmp_path))
+    read_roster_cached(data[2], cache_dir=str(tmp_path), max_bytes=int(sizes * 1.2))
+    remaining = parquet_files(tmp_path)
+    assert len(remaining) == 2
+    assert not any(name.startswith(names[1]) for name in remaining)
+
+
+def parquet_names(cache_dir, prefixes):
+    files = parquet_files(cache_dir)
+    return [next(name for name in files if name.startswith(prefix)) for prefix in prefixes]
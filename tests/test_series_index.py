@@ -0,0 +1,84 @@
+"""get_future_series_teachers (index) tegen de oorspronkelijke iterrows-implementatie."""
+import random
+
+import pandas as pd
+import pytest
+
+from rooster_engine import (
+    dutch_date_str, get_future_series_teachers, normalize_roster, select_records, series_key_from_desc,
+    split_docenten,
+)
+
+COLUMN_VARS = {role: role for role in
+               ["Datum", "Van", "Tot", "Student groep", "Zaal", "Beschrijving NL", "Docenten"]}
+
+
+def baseline_future_series_teachers(row, df, column_vars):
+    """
+    De implementatie van vóór de serie-index: per event alle rijen opnieuw
+    sleutelen en filteren. astype(str) is hier str() per cel, zoals in pandas 2
+    (pandas 3 laat lege cellen leeg in plaats van 'nan').
+    """
+    cur_dt = row.get("_dt")
+    if pd.isna(cur_dt):
+        cur_dt = pd.to_datetime(row[column_vars["Datum"]], dayfirst=True, errors="coerce")
+    cur_key = series_key_from_desc(row[column_vars["Beschrijving NL"]])
+    all_keys = df[column_vars["Beschrijving NL"]].astype(object).map(str).apply(series_key_from_desc)
+    same_series = all_keys == cur_key
+    same_grp = df[column_vars["Student groep"]] == row[column_vars["Student groep"]]
+    future = df["_dt"] > cur_dt
+    lines, seen = [], set()
+    for _, srow in df[same_series & same_grp & future].iterrows():
+        dt = srow.get("_dt")
+        if pd.isna(dt):
+            dt = pd.to_datetime(srow[column_vars["Datum"]], dayfirst=True, errors="coerce")
+        teacher_list = split_docenten(srow[column_vars["Docenten"]])
+        teacher_str = ", ".join(teacher_list) if teacher_list else "onbekend"
+        line = (f"{dutch_date_str(dt)} – {str(srow[column_vars['Beschrijving NL']]).strip()} – {teacher_str} "
+                f"(lokaal: {srow[column_vars['Zaal']]})")
+        if line not in seen:
+            seen.add(line)
+            lines.append(line)
+    return lines
+
+
+def random_roster(seed, rows=120):
+    rnd = random.Random(seed)
+    descs = ["Anamnesetraining 1", "Anamnesetraining 2", "anamnesetraining  III", "Practicum ECG",
+             "Practicum ECG 4", "Intervisie", " Intervisie ", 12, 3.5, None]
+    groups = ["CRIM-1A", "CRIM-1B", "MED-2A", None, float("nan")]
+    dates = [f"{d:02d}-09-2025" for d in range(1, 29)] + ["geen datum", None]
+    out = []
+    for _ in range(rows):
+        out.append({
+            "Datum": rnd.choice(dates),
+            "Van": rnd.choice(["08:30", "10:15", "13:00"]),
+            "Tot": rnd.choice(["10:00", "12:00", "15:00"]),
+            "Student groep": rnd.choice(groups),
+            "Zaal": rnd.choice(["B.1.12", "A.0.01", None]),
+            "Beschrijving NL": rnd.choice(descs),
+            "Docenten": rnd.choice(["Piet", "Piet, Klaas", "Anna/Jan", "allen", "", None]),
+        })
+    return pd.DataFrame(out, dtype=object)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_baseline(seed):
+    roster = normalize_roster(random_roster(seed), COLUMN_VARS)
+    rows = roster["rows"]
+    for row in select_records(rows, slice(None)):
+        assert get_future_series_teachers(row, roster["series_index"], COLUMN_VARS) == \
+            baseline_future_series_teachers(row, rows, COLUMN_VARS)
+
+
+def test_series_without_future_lessons():
+    df = pd.DataFrame({"Datum": ["01-09-2025", "08-09-2025", "15-09-2025"], "Van": ["08:30"] * 3,
+                       "Tot": ["10:00"] * 3, "Student groep": ["CRIM-1A"] * 3, "Zaal": ["B.1.12"] * 3,
+                       "Beschrijving NL": ["Ethiek 1", "Ethiek 2", "Statistiek"],
+                       "Docenten": ["Piet", "Klaas", "Anna"]}, dtype=object)
+    roster = normalize_roster(df, COLUMN_VARS)
+    first, second, other = select_records(roster["rows"], slice(None))
+    assert get_future_series_teachers(first, roster["series_index"], COLUMN_VARS) == \
+        ["maandag 08 september 2025 – Ethiek 2 – Klaas (lokaal: B.1.12)"]
+    assert get_future_series_teachers(second, roster["series_index"], COLUMN_VARS) == []
+    assert get_future_series_teachers(other, roster["series_index"], COLUMN_VARS) == []
@@ -0,0 +1,37 @@
+"""Agenda's per docent, groep en zaal in één doorloop (generate_views)."""
+import pytest
+from icalendar import Calendar
+
+from rooster_engine import _view_name, generate_all, generate_views, normalize_roster
+from rooster_synth import make_roster
+
+
+@pytest.fixture(scope="module")
+def roster_and_columns():
+    df = make_roster(400, allen=0.1, seed=5)
+    column_vars = {col: col for col in df.columns if col != "Opmerking"}
+    return normalize_roster(df, column_vars), column_vars
+
+
+def event_count(ics_bytes):
+    return len(Calendar.from_ical(ics_bytes).walk("VEVENT"))
+
+
+@pytest.mark.parametrize("include_allen", [False, True])
+def test_teacher_view_matches_generate_all(roster_and_columns, include_allen):
+    roster, column_vars = roster_and_columns
+    views = generate_views(roster, column_vars, include_allen=include_allen)
+    assert views["docent"] == generate_all(roster, column_vars, include_allen=include_allen)
+
+
+@pytest.mark.parametrize("include_allen", [False, True])
+def test_allen_rows_always_in_group_and_room(roster_and_columns, include_allen):
+    roster, column_vars = roster_and_columns
+    rows = roster["rows"]
+    assert rows["_allen_only"].any()
+    views = generate_views(roster, column_vars, ["groep", "zaal"], include_allen=include_allen,
+                           allen_inclusion={idx: False for idx in rows["orig_idx"]})
+    for view, column in (("groep", "Student groep"), ("zaal", "Zaal")):
+        names = rows[column_vars[column]].astype(object).map(_view_name)
+        expected = names.dropna().value_counts()
+        assert {name: event_count(ics) for name, ics in views[view].items()} == expected.to_dict()